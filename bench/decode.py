@@ -0,0 +1,78 @@
+"""Compare full JSON decoding with projection-based decoding.
+
+Measures decode time and retained memory for one page of organization
+devices, as returned by /organizations/{organizationId}/devices.
+
+    python -m bench.decode --rows 1000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Any, Callable
+from lib.inventory import DEVICE_FIELDS
+from lib.projection import project
+
+
+def _page(rows: int) -> bytes:
+    return json.dumps([{
+        'name': f'AP {i}',
+        'lat': 37.4180951010362,
+        'lng': -122.098531723022,
+        'address': '1600 Amphitheatre Parkway, Mountain View, CA',
+        'notes': 'My AP note',
+        'tags': ['recently-added', 'floor-2'],
+        'networkId': f'N_{i // 50}',
+        'serial': f'Q2XX-{i // 10000:04d}-{i % 10000:04d}',
+        'model': 'MR46',
+        'imei': None,
+        'mac': '00:11:22:33:44:55',
+        'lanIp': '1.2.3.4',
+        'firmware': 'wireless-29-7',
+        'productType': 'wireless',
+        'configurationUpdatedAt': '2024-01-01T00:00:00Z',
+        'url': f'https://n1.meraki.com/my-network/n/manage/nodes/new_list/{i}',
+        'details': [
+            {'name': 'Running software version', 'value': '29.7'},
+            {'name': 'Catalyst serial', 'value': '123ABC'},
+        ],
+        'beaconIdParams': {'uuid': '00000000-0000-0000-0000-000000000000',
+                           'major': 5, 'minor': 3},
+    } for i in range(rows)]).encode()
+
+
+def _measure(body: bytes, decode: Callable[[bytes], Any],
+             repeat: int) -> tuple[float, int]:
+    ts = time.perf_counter()
+    for _ in range(repeat):
+        decode(body)
+    duration = (time.perf_counter() - ts) / repeat
+
+    tracemalloc.start()
+    data = decode(body)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return duration, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare full and projection-based JSON decoding.')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    body = _page(args.rows)
+    full = _measure(body, json.loads, args.repeat)
+    proj = _measure(
+        body, lambda b: project(json.loads(b), DEVICE_FIELDS), args.repeat)
+
+    print(f'page: {args.rows} rows, {len(body) / 1024:.1f} kB')
+    for name, (duration, retained) in (('full', full), ('projection', proj)):
+        print(f'  {name:<11} {duration * 1000:8.2f} ms '
+              f'{retained / 1024:10.1f} kB retained')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""Benchmark the probe checks against the local Meraki API stand-in.
+
+Runs all checks for N simulated assets and reports checks per second, API
+calls per check, p50/p99 check duration, the request rate (mean and peak per
+second) and peak RSS (of the main process).
+
+    python -m bench.run --devices 1000 --latency 50 --rate-429 0.01
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import resource
+import statistics
+import time
+import aiohttp
+from aiohttp import web
+from libprobe.asset import Asset
+from libprobe.check import Check
+from lib import query as query_mod
+from lib import batch, deadline, ratelimit, repoll
+from lib.check.bss import CheckBss
+from lib.check.connection import CheckConnection
+from lib.check.memory import CheckMemory
+from lib.check.packet import CheckPacket
+from lib.check.wireless import CheckWireless
+from lib.connector import close_sessions
+from lib.worker import Pool
+from .server import ORG_ID, Emulator
+
+
+CHECKS: tuple[type[Check], ...] = (
+    CheckWireless,
+    CheckMemory,
+    CheckPacket,
+    CheckConnection,
+    CheckBss,
+)
+
+
+def _serve(args: argparse.Namespace):
+    emulator = Emulator(args.devices, args.per_network, args.latency / 1000,
+                        args.rate_429, args.not_ready)
+    web.run_app(emulator.app(), host='127.0.0.1', port=args.port,
+                access_log=None, print=None)
+
+
+async def _get_stats(port: int) -> dict[str, int]:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f'http://127.0.0.1:{port}/_stats') as resp:
+            return await resp.json()
+
+
+async def _get_rate(port: int) -> list[int]:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f'http://127.0.0.1:{port}/_rate') as resp:
+            return await resp.json()
+
+
+async def _wait_for_server(port: int):
+    for _ in range(100):
+        try:
+            return await _get_stats(port)
+        except aiohttp.ClientError:
+            await asyncio.sleep(0.1)
+    raise Exception('API stand-in did not start')
+
+
+async def _run_check(check: type[Check], asset: Asset, config: dict,
+                     delay: float) -> tuple[str, float, str | None]:
+    await asyncio.sleep(delay)
+    timeout = min(0.8 * config['_interval'], deadline.MAX_CHECK_TIMEOUT)
+    local_config = {'secret': 'benchmark'}
+    ts = time.monotonic()
+    try:
+        await asyncio.wait_for(
+            check.run(asset, local_config, config),
+            timeout=timeout)
+    except asyncio.TimeoutError:
+        error = 'timed out'
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    else:
+        error = None
+    return check.key, time.monotonic() - ts, error
+
+
+def _pct(values: list[float], pct: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[pct - 1]
+
+
+def _configure(args: argparse.Namespace):
+    # Also used as initializer for the worker processes
+    query_mod.BASE_URL = f'http://127.0.0.1:{args.port}/api/v1'
+    batch.BATCH_WINDOW = args.batch_window
+    ratelimit.RATE_LIMIT_ORG = args.org_rate
+    # Scale the re-poll schedule so not-ready runs finish in reasonable time
+    repoll.REPOLL_DELAY = args.repoll_delay
+    repoll.DATA_READY_LAG = 0.0
+    repoll.WAVE_STEP = min(repoll.WAVE_STEP, args.repoll_delay)
+
+
+async def bench(args: argparse.Namespace):
+    _configure(args)
+    await _wait_for_server(args.port)
+
+    emulator = Emulator(args.devices, args.per_network)
+    serials = emulator.serials[:args.assets or args.devices]
+    checks = [CHECKS[i] for i in range(len(CHECKS))
+              if CHECKS[i].key in args.checks]
+    if args.workers:
+        pool = Pool(CHECKS, args.workers, _configure, (args,))
+        checks = [pool.proxy(check) for check in checks]
+    coros = []
+    for asset_id, serial in enumerate(serials):
+        # The stand-in serves the same devices for every organization
+        org_id = str(int(ORG_ID) + asset_id % args.orgs)
+        config = {'id': org_id, 'serial': serial, '_interval': 300}
+        for check in checks:
+            asset = Asset(asset_id, serial, check.key)
+            delay = random.random() * args.spread
+            coros.append(_run_check(check, asset, config, delay))
+
+    ts = time.monotonic()
+    results = await asyncio.gather(*coros)
+    wall = time.monotonic() - ts - args.spread
+    hits = await _get_stats(args.port)
+    rate = await _get_rate(args.port)
+    await close_sessions()
+
+    n = len(results)
+    calls = sum(hits.values())
+    durations = [duration for _, duration, _ in results]
+    errors: dict[str, int] = {}
+    for _, _, error in results:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f'assets:          {len(serials)}')
+    print(f'checks:          {n} ({sum(errors.values())} failed)')
+    print(f'wall time:       {wall:.2f} s (excluding spread)')
+    print(f'checks/second:   {n / max(wall, 1e-9):.1f}')
+    print(f'API calls/check: {calls / n:.3f} ({calls} calls)')
+    print(f'duration p50:    {_pct(durations, 50):.3f} s')
+    print(f'duration p99:    {_pct(durations, 99):.3f} s')
+    if rate:
+        mean = sum(rate) / len(rate)
+        print(f'requests/second: {mean:.1f} mean, {max(rate)} peak '
+              f'(peak/mean {max(rate) / mean:.2f})')
+    print(f'peak RSS:        {rss:.1f} MB '
+          f'({rss * 1024 / len(serials):.1f} KB per asset)')
+    print()
+    for check in checks:
+        durations = [d for key, d, _ in results if key == check.key]
+        print(f'  {check.key:<12} p50 {_pct(durations, 50):7.3f} s  '
+              f'p99 {_pct(durations, 99):7.3f} s')
+    print()
+    for endpoint, count in sorted(hits.items()):
+        print(f'  {count:>8}  {endpoint}')
+    for error, count in sorted(errors.items()):
+        print(f'  error ({count}x): {error}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the checks against a local API stand-in.')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--devices', type=int, default=100,
+                        help='number of devices in the organization')
+    parser.add_argument('--assets', type=int, default=0,
+                        help='number of monitored assets (default: all)')
+    parser.add_argument('--per-network', type=int, default=50)
+    parser.add_argument('--checks', nargs='+',
+                        default=[check.key for check in CHECKS])
+    parser.add_argument('--latency', type=float, default=50.0,
+                        help='average response latency in milliseconds')
+    parser.add_argument('--rate-429', type=float, default=0.0,
+                        help='fraction of requests answered with a 429')
+    parser.add_argument('--not-ready', type=float, default=0.0,
+                        help='fraction of rows/responses not yet ready '
+                        '(missing or null)')
+    parser.add_argument('--spread', type=float, default=0.0,
+                        help='spread check starts over this many seconds')
+    parser.add_argument('--org-rate', type=float,
+                        default=ratelimit.RATE_LIMIT_ORG)
+    parser.add_argument('--batch-window', type=float,
+                        default=batch.BATCH_WINDOW)
+    parser.add_argument('--repoll-delay', type=float, default=1.0)
+    parser.add_argument('--orgs', type=int, default=1,
+                        help='spread the assets over this many organizations')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='run the checks in worker processes')
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(target=_serve, args=(args,), daemon=True)
+    server.start()
+    try:
+        asyncio.run(bench(args))
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
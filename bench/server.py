@@ -0,0 +1,273 @@
+"""Local stand-in for the Meraki dashboard API.
+
+Emulates the endpoints used by the checks in lib/check/ for an organization
+with a configurable number of devices. Latency, 429 responses and "not
+ready" (empty, missing or null) data can be injected.
+
+    python -m bench.server --devices 1000 --latency 50 --rate-429 0.01
+"""
+import argparse
+import asyncio
+import random
+import time
+from aiohttp import web
+from typing import Any, Callable
+
+
+ORG_ID = '123456'
+BASE = '/api/v1'
+
+
+class Emulator:
+    def __init__(self, devices: int = 100, per_network: int = 50,
+                 latency: float = 0.0, rate_429: float = 0.0,
+                 not_ready: float = 0.0):
+        self.serials = [f'Q2XX-{i // 10000:04d}-{i % 10000:04d}'
+                        for i in range(devices)]
+        self.index = {serial: i for i, serial in enumerate(self.serials)}
+        self.per_network = per_network
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.not_ready = not_ready
+        self.hits: dict[str, int] = {}
+        self.per_second: dict[int, int] = {}
+
+    def network_id(self, serial: str) -> str:
+        return f'N_{self.index[serial] // self.per_network}'
+
+    def _not_ready(self) -> bool:
+        return random.random() < self.not_ready
+
+    def _rows(self, serials: list[str],
+              row: Callable[[str, bool], dict[str, Any]]
+              ) -> list[dict[str, Any]]:
+        # Rows which are not ready are either left out or have null values;
+        # `row` is called with the serial and whether to use null values
+        rows = []
+        for serial in serials:
+            if not self._not_ready():
+                rows.append(row(serial, False))
+            elif random.random() < 0.5:
+                rows.append(row(serial, True))
+        return rows
+
+    def _select(self, request: web.Request) -> list[str]:
+        serials = request.query.getall('serials[]', [])
+        if serials:
+            return [s for s in serials if s in self.index]
+        return self.serials
+
+    def _page(self, request: web.Request, rows: list[Any],
+              max_per_page: int = 1000) -> tuple[list[Any], dict[str, str]]:
+        per_page = min(int(request.query.get('perPage', max_per_page)),
+                       max_per_page)
+        start = int(request.query.get('startingAfter', 0))
+        headers = {}
+        if start + per_page < len(rows):
+            url = request.url.update_query({'startingAfter': start + per_page})
+            headers['Link'] = f'<{url}>; rel=next'
+        return rows[start:start + per_page], headers
+
+    # Organization wide endpoints
+
+    def devices(self, request: web.Request):
+        rows = [{
+            'serial': serial,
+            'name': f'AP {serial}',
+            'mac': f'00:18:0a:00:{self.index[serial] // 256 % 256:02x}:'
+                   f'{self.index[serial] % 256:02x}',
+            'networkId': self.network_id(serial),
+            'productType': 'wireless',
+            'model': 'MR46',
+            'address': '',
+            'lat': 52.0,
+            'lng': 5.0,
+            'notes': '',
+            'configurationUpdatedAt': '2024-01-01T00:00:00Z',
+            'firmware': 'wireless-29-7',
+            'details': [
+                {'name': 'Running software version', 'value': '29.7'}],
+        } for serial in self._select(request)]
+        after = request.query.get('configurationUpdatedAfter')
+        if after is not None:
+            rows = [row for row in rows
+                    if row['configurationUpdatedAt'] > after]
+        return self._page(request, rows, 5000)
+
+    def statuses(self, request: web.Request):
+        rows = [{
+            'serial': serial,
+            'status': 'online',
+            'lastReportedAt': '2024-01-01T00:00:00Z',
+            'lanIp': '10.0.0.1',
+            'gateway': '10.0.0.254',
+            'ipType': 'dhcp',
+            'primaryDns': '10.0.0.254',
+            'secondaryDns': None,
+        } for serial in self._select(request)]
+        return self._page(request, rows)
+
+    def memory(self, request: web.Request):
+        rows = self._rows(self._select(request), lambda serial, null: {
+            'serial': serial,
+            'provisioned': 1048576,
+            'used': {'median': None if null else 524288},
+            'free': {'median': None if null else 524288},
+        })
+        page, headers = self._page(request, rows, 20)
+        return {'items': page}, headers
+
+    def packet_loss(self, request: web.Request):
+        nulls = {'total': None, 'lost': None, 'lossPercentage': None}
+        rows = self._rows(self._select(request), lambda serial, null: {
+            'device': {'serial': serial},
+            'network': {'id': self.network_id(serial)},
+            'upstream': nulls if null else
+            {'total': 1000, 'lost': 1, 'lossPercentage': 0.1},
+            'downstream': nulls if null else
+            {'total': 1000, 'lost': 0, 'lossPercentage': 0},
+        })
+        return self._page(request, rows)
+
+    def channel_utilization(self, request: web.Request):
+        rows = self._rows(self._select(request), lambda serial, null: {
+            'serial': serial,
+            'network': {'id': self.network_id(serial)},
+            'byBand': [] if null else [{
+                'band': band,
+                'wifi': {'percentage': 10.0},
+                'nonWifi': {'percentage': 2.0},
+                'total': {'percentage': 12.0},
+            } for band in ('2.4', '5')],
+        })
+        return self._page(request, rows)
+
+    # Network endpoints
+
+    def latency_stats(self, request: web.Request):
+        network_id = request.match_info['network_id']
+        serials = [serial for serial in self.serials
+                   if self.network_id(serial) == network_id]
+        traffic = {'rawDistribution': {'1': 10, '2': 10}, 'avg': 1.5}
+        no_traffic = {'rawDistribution': {}, 'avg': None}
+        return self._rows(serials, lambda serial, null: {
+            'serial': serial,
+            'latencyStats': {
+                name: no_traffic if null else traffic
+                for name in ('backgroundTraffic', 'bestEffortTraffic',
+                             'videoTraffic', 'voiceTraffic')},
+        }), {}
+
+    def _history(self, row: dict[str, Any]) -> Callable:
+        def handler(request: web.Request):
+            if not self._not_ready():
+                return [row], {}
+            # Not ready; no data or a row with null values
+            return random.choice(([], [dict.fromkeys(row)])), {}
+        return handler
+
+    # Device endpoints
+
+    def connection_stats(self, request: web.Request):
+        serial = request.match_info['serial']
+        return {
+            'serial': serial,
+            'connectionStats': {
+                'assoc': 0, 'auth': 0, 'dhcp': 0, 'dns': 0, 'success': 10},
+        }, {}
+
+    def wireless_status(self, request: web.Request):
+        return {'basicServiceSets': [{
+            'ssidName': 'Corp',
+            'ssidNumber': 0,
+            'enabled': True,
+            'band': band,
+            'bssid': f'8A:15:04:00:00:0{i}',
+            'channel': channel,
+            'channelWidth': '20 MHz',
+            'power': '18 dBm',
+            'visible': True,
+            'broadcasting': True,
+        } for i, (band, channel) in enumerate((
+            ('2.4 GHz', 11), ('5 GHz', 64)))]}, {}
+
+    def _wrap(self, name: str, func: Callable):
+        async def handler(request: web.Request) -> web.Response:
+            self.hits[name] = self.hits.get(name, 0) + 1
+            second = int(time.time())
+            self.per_second[second] = self.per_second.get(second, 0) + 1
+            if self.latency:
+                await asyncio.sleep(self.latency * (0.5 + random.random()))
+            if random.random() < self.rate_429:
+                return web.json_response(
+                    {'errors': ['API rate limit exceeded']},
+                    status=429, headers={'Retry-After': '1'})
+            data, headers = func(request)
+            return web.json_response(data, headers=headers)
+        return handler
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.hits)
+
+    async def rate(self, request: web.Request) -> web.Response:
+        # Requests per second, from the first to the last request
+        if not self.per_second:
+            return web.json_response([])
+        first, last = min(self.per_second), max(self.per_second)
+        return web.json_response([self.per_second.get(second, 0)
+                                  for second in range(first, last + 1)])
+
+    def app(self) -> web.Application:
+        org = f'{BASE}/organizations/{{org_id}}'
+        net = f'{BASE}/networks/{{network_id}}/wireless'
+        dev = f'{BASE}/devices/{{serial}}/wireless'
+        routes = {
+            f'{org}/devices': self.devices,
+            f'{org}/devices/statuses': self.statuses,
+            f'{org}/devices/system/memory/usage/history/byInterval':
+                self.memory,
+            f'{org}/wireless/devices/packetLoss/byDevice': self.packet_loss,
+            f'{org}/wireless/devices/channelUtilization/byDevice':
+                self.channel_utilization,
+            f'{net}/devices/latencyStats': self.latency_stats,
+            f'{net}/latencyHistory': self._history({'avgLatencyMs': 2}),
+            f'{net}/dataRateHistory': self._history({
+                'averageKbps': 1000, 'downloadKbps': 800,
+                'uploadKbps': 200}),
+            f'{net}/clientCountHistory': self._history({'clientCount': 12}),
+            f'{net}/signalQualityHistory': self._history({
+                'snr': 39, 'rssi': -59}),
+            f'{dev}/connectionStats': self.connection_stats,
+            f'{dev}/status': self.wireless_status,
+        }
+        app = web.Application()
+        for path, func in routes.items():
+            name = path.removeprefix(BASE)
+            app.router.add_get(path, self._wrap(name, func))
+        app.router.add_get('/_stats', self.stats)
+        app.router.add_get('/_rate', self.rate)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Local stand-in for the Meraki dashboard API.')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--devices', type=int, default=100)
+    parser.add_argument('--per-network', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='average response latency in milliseconds')
+    parser.add_argument('--rate-429', type=float, default=0.0,
+                        help='fraction of requests answered with a 429')
+    parser.add_argument('--not-ready', type=float, default=0.0,
+                        help='fraction of rows/responses not yet ready '
+                        '(missing or null)')
+    args = parser.parse_args()
+
+    emulator = Emulator(args.devices, args.per_network, args.latency / 1000,
+                        args.rate_429, args.not_ready)
+    web.run_app(emulator.app(), port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
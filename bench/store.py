@@ -0,0 +1,118 @@
+"""Measure snapshot memory per monitored AP.
+
+Compares keeping the decoded rows (one nested dict per device and endpoint)
+with the compact, serial indexed store used for snapshots.
+
+    python -m bench.store --devices 10000
+"""
+import argparse
+import json
+import tracemalloc
+from types import MappingProxyType
+from typing import Any, Callable
+from lib.check.memory import MEMORY_FIELDS
+from lib.check.packet import PACKET_LOSS_FIELDS
+from lib.check.wireless import CHANNEL_UTILIZATION_FIELDS, STATUS_FIELDS
+from lib.projection import Fields, project
+from lib.store import CompactRows
+
+
+def _status(serial: str, i: int) -> dict[str, Any]:
+    return {
+        'name': f'AP {i}', 'serial': serial, 'mac': '00:11:22:33:44:55',
+        'publicIp': '123.123.123.1', 'networkId': f'N_{i // 50}',
+        'status': 'online', 'lastReportedAt': '2024-01-01T00:00:00.090210Z',
+        'lanIp': f'10.0.{i // 256 % 256}.{i % 256}', 'gateway': '10.0.0.1',
+        'ipType': 'dhcp', 'primaryDns': '8.8.8.8', 'secondaryDns': '8.8.4.4',
+        'productType': 'wireless', 'model': 'MR46', 'tags': ['floor-2'],
+    }
+
+
+def _memory(serial: str, i: int) -> dict[str, Any]:
+    return {
+        'serial': serial, 'model': 'MR46',
+        'network': {'id': f'N_{i // 50}', 'name': 'Main Office'},
+        'provisioned': 1048576,
+        'used': {'minimum': 500000 + i, 'maximum': 600000 + i,
+                 'median': 550000 + i},
+        'free': {'minimum': 448576 - i, 'maximum': 548576 - i,
+                 'median': 498576 - i},
+    }
+
+
+def _packet_loss(serial: str, i: int) -> dict[str, Any]:
+    return {
+        'device': {'serial': serial, 'name': f'AP {i}',
+                   'mac': '00:11:22:33:44:55'},
+        'network': {'id': f'N_{i // 50}', 'name': 'Main Office'},
+        'upstream': {'total': 1000 + i, 'lost': i % 7,
+                     'lossPercentage': i % 7 / (1000 + i) * 100},
+        'downstream': {'total': 2000 + i, 'lost': i % 3,
+                       'lossPercentage': i % 3 / (2000 + i) * 100},
+    }
+
+
+def _channel_utilization(serial: str, i: int) -> dict[str, Any]:
+    return {
+        'serial': serial, 'mac': '00:11:22:33:44:55',
+        'network': {'id': f'N_{i // 50}'},
+        'byBand': [{
+            'band': band,
+            'wifi': {'percentage': 10.0 + i % 13},
+            'nonWifi': {'percentage': 2.0 + i % 5},
+            'total': {'percentage': 12.0 + i % 17},
+        } for band in ('2.4', '5')],
+    }
+
+
+ENDPOINTS: tuple[tuple[Callable, Fields], ...] = (
+    (_status, STATUS_FIELDS),
+    (_memory, MEMORY_FIELDS),
+    (_packet_loss, PACKET_LOSS_FIELDS),
+    (_channel_utilization, CHANNEL_UTILIZATION_FIELDS),
+)
+
+
+def _measure(devices: int, build: Callable[[dict, Fields], Any]) -> int:
+    # Rows are decoded from JSON like they would be from a response
+    serials = [f'Q2XX-{i // 10000:04d}-{i % 10000:04d}'
+               for i in range(devices)]
+    bodies = [
+        (json.dumps([func(s, i) for i, s in enumerate(serials)]), fields)
+        for func, fields in ENDPOINTS]
+
+    tracemalloc.start()
+    snapshots = []
+    for body, fields in bodies:
+        rows = json.loads(body)
+        by_serial = {
+            row.get('serial') or row['device']['serial']: row
+            for row in rows}
+        del rows
+        snapshots.append(build(by_serial, fields))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure snapshot memory per monitored AP.')
+    parser.add_argument('--devices', type=int, default=10000)
+    args = parser.parse_args()
+
+    builds: dict[str, Callable[[dict, Fields], Any]] = {
+        'rows': lambda rows, _: MappingProxyType(rows),
+        'projected': lambda rows, fields: MappingProxyType(
+            {k: project(v, fields) for k, v in rows.items()}),
+        'compact': lambda rows, fields: CompactRows(rows, fields),
+    }
+    print(f'devices: {args.devices}, endpoints: {len(ENDPOINTS)}')
+    for name, build in builds.items():
+        size = _measure(args.devices, build)
+        print(f'  {name:<10} {size / 1024 / 1024:8.2f} MB '
+              f'{size / args.devices:8.0f} bytes per AP')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import math
+import os
+from .persist import put, restore
+from .repoll import BUCKET
+
+
+# Counters (packet loss, connection stats) are reported per interval. After
+# missed intervals the next request covers the gap, with BACKFILL_MAX seconds
+# as maximum; the counts are then scaled to one interval so the reported
+# values keep their meaning (ratios cover the whole gap).
+BACKFILL_MAX = int(os.getenv('BACKFILL_MAX', '3600'))
+
+# Wall clock end of the last collected window by asset ID and endpoint
+_last: dict[tuple[int, str], float] = {}
+
+
+@restore('window')
+def _restore_window(key: list, end: float, ts: float):
+    asset_id, endpoint = key
+    _last[(asset_id, endpoint)] = end
+
+
+def timespan(asset_id: int, endpoint: str, now: float) -> int:
+    """Return the timespan to request at `now` for an asset and endpoint.
+    The timespan is only wider than an interval to cover the exact gap since
+    the last collected window."""
+    last = _last.get((asset_id, endpoint))
+    if last is None:
+        return BUCKET
+    gap = math.ceil(now - last)
+    return BUCKET if gap <= BUCKET else min(gap, BACKFILL_MAX)
+
+
+def collected(asset_id: int, endpoint: str, end: float):
+    """Register the window which was requested at `end` as collected."""
+    _last[(asset_id, endpoint)] = end
+    put('window', (asset_id, endpoint), end)
+
+
+def per_interval(count: int | None, span: int) -> int | None:
+    """Scale a count for a timespan of `span` seconds to one interval."""
+    if count is None or span <= BUCKET:
+        return count
+    return round(count * BUCKET / span)
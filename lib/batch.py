@@ -0,0 +1,119 @@
+import asyncio
+import os
+from typing import Any
+from .projection import Fields
+from .query import query_pages
+from .repoll import repolling
+from .snapshot import EndpointKey, lookup, register
+from .trace import span
+
+
+# Serials requested for the same organization endpoint within this window
+# (in seconds) are collected and fetched using a single request.
+BATCH_WINDOW = float(os.getenv('BATCH_WINDOW', '2.0'))
+
+# Limit the number of serials per request to keep the URI length sane.
+BATCH_MAX_SERIALS = 100
+
+
+class Batch:
+    def __init__(self, local_config: dict, path: str, params: str,
+                 per_page: int):
+        self.local_config = local_config
+        self.path = path
+        self.params = params
+        self.per_page = per_page
+        self.waiters: dict[str, list[asyncio.Future]] = {}
+
+
+_batches: dict[EndpointKey, Batch] = {}
+_tasks: set[asyncio.Task] = set()
+
+
+def _serial(row: dict[str, Any]) -> str | None:
+    # Most organization endpoints return the serial as a top level field,
+    # some (for example packet loss) nest it in a `device` object.
+    serial = row.get('serial')
+    if serial is None:
+        device = row.get('device')
+        if isinstance(device, dict):
+            serial = device.get('serial')
+    return serial
+
+
+async def fetch_rows(local_config: dict, path: str, params: str,
+                     serials: list[str], per_page: int = 1000
+                     ) -> dict[str | None, dict[str, Any]]:
+    """Fetch the rows for the given serials using a single (paginated)
+    request. Returns the rows by serial."""
+    parts = [params] if params else []
+    parts.extend(f'serials[]={serial}' for serial in serials)
+    req = f'{path}?{"&".join(parts)}'
+    rows: dict[str | None, dict[str, Any]] = {}
+    async for page in query_pages(local_config, req, per_page=per_page):
+        for row in page:
+            if isinstance(row, dict):
+                rows[_serial(row)] = row
+    return rows
+
+
+async def _fetch(batch: Batch, serials: list[str]):
+    try:
+        rows = await fetch_rows(batch.local_config, batch.path, batch.params,
+                                serials, batch.per_page)
+    except Exception as e:
+        for serial in serials:
+            for fut in batch.waiters[serial]:
+                if not fut.done():
+                    fut.set_exception(e)
+    else:
+        for serial in serials:
+            row = rows.get(serial)
+            for fut in batch.waiters[serial]:
+                if not fut.done():
+                    fut.set_result(row)
+
+
+async def _flush(key: EndpointKey, batch: Batch):
+    await asyncio.sleep(BATCH_WINDOW)
+    # New requests for this endpoint from now on will start a new batch
+    del _batches[key]
+
+    serials = list(batch.waiters)
+    size = BATCH_MAX_SERIALS
+    await asyncio.gather(*(
+        _fetch(batch, serials[i:i + size])
+        for i in range(0, len(serials), size)))
+
+
+async def query_serial(local_config: dict, path: str, params: str,
+                       serial: str, per_page: int = 1000,
+                       fields: Fields | None = None,
+                       prefetch: bool = True) -> dict[str, Any] | None:
+    """Query an organization wide endpoint for a single serial.
+
+    When `prefetch` is True, the row is served from the prefetched snapshot
+    if available, except for a re-poll; the snapshot only stores `fields`.
+    Otherwise, requests for the same API key, endpoint and parameters are
+    batched into a single request with multiple `serials[]`.
+    Returns the row for the given serial or None when the serial is not in
+    the response.
+    """
+    key = (local_config.get('secret'), path, params, fields)
+    if prefetch:
+        register(key, local_config, path, params, per_page, fields, serial)
+        found, row = lookup(key, serial)
+        if found and not repolling.get():
+            return row
+
+    batch = _batches.get(key)
+    if batch is None:
+        batch = _batches[key] = Batch(local_config, path, params, per_page)
+        task = asyncio.ensure_future(_flush(key, batch))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+
+    fut = asyncio.get_running_loop().create_future()
+    batch.waiters.setdefault(serial, []).append(fut)
+    with span('batch wait', path=path):
+        return await fut
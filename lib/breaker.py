@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import os
+import time
+from .metrics import set_gauge
+
+
+# A circuit (API key, organization and endpoint) opens after
+# BREAKER_FAILURES consecutive failures. Requests then fail fast; after
+# BREAKER_TIMEOUT seconds a single probe request is allowed which closes the
+# circuit on success.
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '5'))
+BREAKER_TIMEOUT = float(os.getenv('BREAKER_TIMEOUT', '60'))
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def _is_failure(status: int) -> bool:
+    # Server errors and a revoked (or invalid) API key; other client errors
+    # are specific for a request, 429 is handled by the rate limiter
+    return status >= 500 or status in (401, 403)
+
+
+class Circuit:
+    def __init__(self, org_id: str | None, endpoint: str):
+        self.org_id = org_id
+        self.endpoint = endpoint
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+        self.error = ''
+
+    def _gauge(self, value: int):
+        set_gauge(
+            f'meraki_circuit_open{{organization="{self.org_id or ""}",'
+            f'endpoint="{self.endpoint}"}}', value)
+
+    def allow(self) -> bool:
+        """Raise CircuitOpenError unless a request is allowed. Returns True
+        if the request is a (half-open) probe."""
+        if self.opened_at is None:
+            return False
+        if not self.probing and \
+                time.monotonic() - self.opened_at >= BREAKER_TIMEOUT:
+            self.probing = True
+            return True
+        raise CircuitOpenError(
+            f'{self.endpoint} unavailable (circuit open); '
+            f'last error: {self.error}')
+
+    def on_status(self, status: int, reason: str | None):
+        if status == 429:
+            # Neither a success nor a failure; allow a next probe
+            self.probing = False
+        elif _is_failure(status):
+            self._failure(f'response status code: {status}; reason: {reason}')
+        else:
+            self._success()
+
+    def on_error(self, e: BaseException, probe: bool):
+        if isinstance(e, asyncio.CancelledError):
+            if probe:
+                # No verdict; allow a next probe
+                self.probing = False
+        else:
+            self._failure(str(e) or type(e).__name__)
+
+    def _success(self):
+        self.failures = 0
+        self.probing = False
+        if self.opened_at is not None:
+            self.opened_at = None
+            logging.info(
+                f'circuit closed for {self.endpoint} ({self.org_id})')
+            self._gauge(0)
+
+    def _failure(self, error: str):
+        self.failures += 1
+        self.error = error
+        if self.probing or (
+                self.opened_at is None and
+                self.failures >= BREAKER_FAILURES):
+            if self.opened_at is None:
+                logging.warning(
+                    f'circuit opened for {self.endpoint} ({self.org_id}); '
+                    f'{error}')
+                self._gauge(1)
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+
+_circuits: dict[tuple[str, str | None, str], Circuit] = {}
+
+
+def get_circuit(api_key: str, org_id: str | None, endpoint: str) -> Circuit:
+    key = (api_key, org_id, endpoint)
+    circuit = _circuits.get(key)
+    if circuit is None:
+        circuit = _circuits[key] = Circuit(org_id, endpoint)
+    return circuit
@@ -1,6 +1,7 @@
 from typing import Any
 from libprobe.asset import Asset
 from libprobe.check import Check
+from ..checkrun import checkrun
 from ..query import query
 
 
@@ -9,6 +10,7 @@ class CheckBss(Check):
     unchanged_eol = 14400
 
     @staticmethod
+    @checkrun(priority=1)
     async def run(asset: Asset, local_config: dict, config: dict) -> dict:
         serial = config.get('serial')
         if not serial:
@@ -16,7 +18,7 @@ class CheckBss(Check):
                 'Missing Serial in asset collector configuration')
 
         req = f'/devices/{serial}/wireless/status'
-        resp = await query(local_config, req)
+        resp = await query(local_config, req, org_id=config.get('id'))
 
         bss = resp.get('basicServiceSets')
         if not isinstance(bss, (list, tuple)):
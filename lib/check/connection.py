@@ -1,6 +1,9 @@
 import logging
+import time
 from libprobe.asset import Asset
 from libprobe.check import Check
+from ..backfill import collected, per_interval, timespan
+from ..checkrun import checkrun
 from ..query import query
 
 
@@ -9,6 +12,7 @@ class CheckConnection(Check):
     unchanged_eol = 14400
 
     @staticmethod
+    @checkrun(priority=2, bucket_data=True)
     async def run(asset: Asset, local_config: dict, config: dict) -> dict:
 
         interval = config.get('_interval', 300)
@@ -27,8 +31,10 @@ class CheckConnection(Check):
             raise Exception(
                 'Missing Serial in asset collector configuration')
 
-        req = f'/devices/{serial}/wireless/connectionStats?timespan=300'
-        resp = await query(local_config, req)
+        end = time.time()
+        span = timespan(asset.id, 'connectionStats', end)
+        req = f'/devices/{serial}/wireless/connectionStats?timespan={span}'
+        resp = await query(local_config, req, org_id=org_id)
         if len(resp) == 0:
             raise Exception(
                 'Connection stats for wireless '
@@ -36,12 +42,14 @@ class CheckConnection(Check):
         connection_stats = resp['connectionStats']
         item = {
             "name": serial,
-            "assoc": connection_stats['assoc'],  # int
-            "auth": connection_stats['auth'],  # int
-            "dhcp": connection_stats['dhcp'],  # int
-            "dns": connection_stats['dns'],  # int
-            "success": connection_stats['success'],  # int
+            # Counts for a backfill are scaled to one interval
+            "assoc": per_interval(connection_stats['assoc'], span),  # int
+            "auth": per_interval(connection_stats['auth'], span),  # int
+            "dhcp": per_interval(connection_stats['dhcp'], span),  # int
+            "dns": per_interval(connection_stats['dns'], span),  # int
+            "success": per_interval(connection_stats['success'], span),  # int
         }
+        collected(asset.id, 'connectionStats', end)
 
         state = {
             "stats": [item],  # single item
@@ -1,23 +1,33 @@
 import logging
-import asyncio
-import random
 from typing import Any
 from libprobe.asset import Asset
 from libprobe.check import Check
-from ..query import query
+from ..batch import query_serial
+from ..checkrun import checkrun
+from ..projection import Fields
+from ..repoll import repoll
+
+
+MEMORY_FIELDS: Fields = (
+    'serial',
+    'provisioned',
+    ('used', ('median',)),
+    ('free', ('median',)),
+)
 
 
 async def get_memory(org_id: str, serial: str,
                      local_config: dict) -> dict[str, Any]:
-    req = (
+    path = (
         f'/organizations/{org_id}/devices/system/memory/usage/history/'
-        f'byInterval?serials[]={serial}&interval=300&timespan=300')
-    resp = await query(local_config, req)
-    if not isinstance(resp, dict) or len(resp.get('items', [])) == 0:
+        'byInterval')
+    memory = await query_serial(local_config, path,
+                                'interval=300&timespan=300', serial,
+                                per_page=20, fields=MEMORY_FIELDS)
+    if memory is None:
         raise Exception(
             'Memory usage history data for device with '
             f'serial `{serial}` not ready to query')
-    memory = resp['items'][0]
     prov = memory["provisioned"]  # int?
     used = memory["used"]["median"]  # int?
     free = memory["free"]["median"]  # int?
@@ -37,6 +47,7 @@ class CheckMemory(Check):
     unchanged_eol = 14400
 
     @staticmethod
+    @checkrun(priority=2, bucket_data=True)
     async def run(asset: Asset, local_config: dict, config: dict) -> dict:
 
         interval = config.get('_interval', 300)
@@ -55,14 +66,12 @@ class CheckMemory(Check):
             raise Exception(
                 'Missing Serial in asset collector configuration')
 
-        try:
-            item = await get_memory(org_id, serial, local_config)
-            assert item['provisioned'] is not None
-            assert item['used'] is not None
-            assert item['free'] is not None
-        except Exception:
-            await asyncio.sleep(16.0 + random.random()*5.0)  # Retry
-            item = await get_memory(org_id, serial, local_config)
+        item = await repoll(
+            lambda: get_memory(org_id, serial, local_config),
+            lambda item: (
+                item['provisioned'] is not None and
+                item['used'] is not None and
+                item['free'] is not None))
 
         state = {
             "memory": [item],  # single item
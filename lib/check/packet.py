@@ -1,10 +1,13 @@
 import logging
-import asyncio
-import random
+import time
 from typing import Any
 from libprobe.asset import Asset
 from libprobe.check import Check
-from ..query import query
+from ..backfill import collected, per_interval, timespan
+from ..batch import query_serial
+from ..checkrun import checkrun
+from ..projection import Fields
+from ..repoll import BUCKET, repoll
 
 
 def _float(inp: float | int | str | None) -> float:
@@ -13,17 +16,24 @@ def _float(inp: float | int | str | None) -> float:
         inp
 
 
-async def get_packet_loss(org_id: str, serial: str,
-                          local_config: dict) -> dict[str, Any]:
-    req = (
-        f'/organizations/{org_id}/wireless/devices/packetLoss/'
-        f'byDevice?timespan=300&serials[]={serial}')
-    resp = await query(local_config, req)
-    if len(resp) == 0:
+PACKET_LOSS_FIELDS: Fields = (
+    ('device', ('serial',)),
+    ('upstream', ('total', 'lost', 'lossPercentage')),
+    ('downstream', ('total', 'lost', 'lossPercentage')),
+)
+
+
+async def get_packet_loss(org_id: str, serial: str, local_config: dict,
+                          span: int = BUCKET) -> dict[str, Any]:
+    path = f'/organizations/{org_id}/wireless/devices/packetLoss/byDevice'
+    # A backfill (wider timespan) is batched but not prefetched
+    packet_loss = await query_serial(local_config, path, f'timespan={span}',
+                                     serial, fields=PACKET_LOSS_FIELDS,
+                                     prefetch=span == BUCKET)
+    if packet_loss is None:
         raise Exception(
             'Packet loss for wireless '
             f'with serial `{serial}` not found')
-    packet_loss = resp[0]
     return packet_loss
 
 
@@ -32,6 +42,7 @@ class CheckPacket(Check):
     unchanged_eol = 0
 
     @staticmethod
+    @checkrun(priority=2, bucket_data=True)
     async def run(asset: Asset, local_config: dict, config: dict) -> dict:
 
         interval = config.get('_interval', 300)
@@ -50,24 +61,34 @@ class CheckPacket(Check):
             raise Exception(
                 'Missing Serial in asset collector configuration')
 
-        try:
-            packet_loss = await get_packet_loss(org_id, serial, local_config)
-            assert packet_loss['upstream']['total'] is not None
-            assert packet_loss['upstream']['lost'] is not None
-            assert packet_loss['downstream']['total'] is not None
-            assert packet_loss['downstream']['lost'] is not None
-        except Exception:
-            await asyncio.sleep(16.0 + random.random()*5.0)  # Retry
-            packet_loss = await get_packet_loss(org_id, serial, local_config)
+        end = 0.0
+        span = BUCKET
+
+        async def get_window() -> dict[str, Any]:
+            # Each attempt requests the window up to the time of the attempt
+            nonlocal end, span
+            end = time.time()
+            span = timespan(asset.id, 'packetLoss', end)
+            return await get_packet_loss(org_id, serial, local_config, span)
+
+        packet_loss = await repoll(
+            get_window,
+            lambda packet_loss: (
+                packet_loss['upstream']['total'] is not None and
+                packet_loss['upstream']['lost'] is not None and
+                packet_loss['downstream']['total'] is not None and
+                packet_loss['downstream']['lost'] is not None))
+        collected(asset.id, 'packetLoss', end)
 
         items: list[dict[str, Any]] = []
 
         for stream in ('upstream', 'downstream'):
             data = packet_loss[stream]
+            # Counts for a backfill are scaled to one interval
             items.append({
                 "name": stream,
-                "total": data["total"],  # int
-                "lost": data["lost"],  # int
+                "total": per_interval(data["total"], span),  # int
+                "lost": per_interval(data["lost"], span),  # int
                 "lossPercentage": _float(data["lossPercentage"]),  # float
             })
             # for lossPercentage we send 0.0 for null, works for our use case
@@ -1,24 +1,53 @@
 import asyncio
 import datetime
 import logging
-import random
 from typing import Any
 from libprobe.asset import Asset
 from libprobe.check import Check
-from libprobe.exceptions import CheckException, Severity
-from ..query import query
+from libprobe.exceptions import (
+    CheckException, IncompleteResultException, Severity)
+from ..batch import query_serial
+from ..checkrun import checkrun
+from ..collector import query_network
+from ..deadline import budget
+from ..inventory import invalidate, lookup_device
+from ..projection import Fields
+from ..query import NotFoundError, query
+from ..repoll import repoll, repolling
+from ..utils import gather_or_cancel, gather_sections
+
+
+STATUS_FIELDS: Fields = (
+    'serial',
+    'status',
+    'lastReportedAt',
+    'lanIp',
+    'gateway',
+    'ipType',
+    'primaryDns',
+    'secondaryDns',
+)
+
+CHANNEL_UTILIZATION_FIELDS: Fields = (
+    'serial',
+    ('byBand', (
+        'band',
+        ('wifi', ('percentage',)),
+        ('nonWifi', ('percentage',)),
+        ('total', ('percentage',)),
+    )),
+)
 
 
 async def update_status(org_id: str, serial: str,
                         local_config: dict[str, Any],
                         item: dict[str, Any]):
-    req = f'/organizations/{org_id}/devices/statuses?serials[]={serial}'
-    resp = await query(local_config, req)
-    if len(resp) == 0:
+    path = f'/organizations/{org_id}/devices/statuses'
+    status = await query_serial(local_config, path, '', serial,
+                                fields=STATUS_FIELDS)
+    if status is None:
         raise Exception(f'Device status with serial `{serial}` not found')
 
-    status = resp[0]
-
     try:
         datestr = status['lastReportedAt']
         last_reported_at = \
@@ -35,12 +64,12 @@ async def update_status(org_id: str, serial: str,
     item["secondaryDns"] = status.get('secondaryDns') or None  # str?
 
 
-async def get_signal_quality(network_id: str, serial: str,
+async def get_signal_quality(org_id: str, network_id: str, serial: str,
                              local_config: dict[str, Any]):
     req = (
         f'/networks/{network_id}/wireless/signalQualityHistory'
         f'?timespan=300&resolution=300&deviceSerial={serial}')
-    resp = await query(local_config, req)
+    resp = await query(local_config, req, org_id=org_id)
     if len(resp) == 0:
         raise CheckException(
             'Signal strength history data for wireless with '
@@ -54,13 +83,47 @@ async def get_signal_quality(network_id: str, serial: str,
     }
 
 
-async def update_latency(network_id: str, serial: str,
+def avg_latency(latency_stats: dict[str, Any]) -> int | None:
+    # Latency stats are split by traffic type (background, best effort,
+    # video and voice); combine the averages weighted by their sample count
+    total, count = 0.0, 0
+    for traffic in latency_stats.values():
+        avg = traffic.get('avg')
+        n = sum(traffic.get('rawDistribution', {}).values())
+        if avg is None or not n:
+            continue
+        total += avg * n
+        count += n
+    return round(total / count) if count else None
+
+
+async def update_latency(org_id: str, network_id: str, serial: str,
                          local_config: dict[str, Any],
                          item: dict[str, Any]):
+    req = (
+        f'/networks/{network_id}/wireless/devices/latencyStats'
+        f'?timespan=300&fields=rawDistribution,avg')
+    rows = await query_network(local_config, org_id, req)
+    row = rows.get(serial)
+    avg_latency_ms = None if row is None else \
+        avg_latency(row.get('latencyStats') or {})
+    if avg_latency_ms is not None:
+        item["avgLatencyMs"] = avg_latency_ms  # int?
+        return
+
+    if not repolling.get():
+        # The network wide stats are requested again by the re-poll
+        raise CheckException(
+            'Latency stats for wireless with '
+            f'serial `{serial}` not ready to query', severity=Severity.LOW)
+
+    # Still not in the network wide stats; fall back to the latency history
+    # for the device
+
     req = (
         f'/networks/{network_id}/wireless/latencyHistory'
         f'?timespan=300&resolution=300&deviceSerial={serial}')
-    resp = await query(local_config, req)
+    resp = await query(local_config, req, org_id=org_id)
     if len(resp) == 0:
         raise CheckException(
             'Signal strength history data for wireless with '
@@ -69,13 +132,13 @@ async def update_latency(network_id: str, serial: str,
     item["avgLatencyMs"] = latency['avgLatencyMs']  # int?
 
 
-async def update_rate(network_id: str, serial: str,
+async def update_rate(org_id: str, network_id: str, serial: str,
                       local_config: dict[str, Any],
                       item: dict[str, Any]):
     req = (
         f'/networks/{network_id}/wireless/dataRateHistory'
         f'?timespan=300&resolution=300&deviceSerial={serial}')
-    resp = await query(local_config, req)
+    resp = await query(local_config, req, org_id=org_id)
     if len(resp) == 0:
         raise CheckException(
             'Data rate history for wireless with '
@@ -91,13 +154,13 @@ async def update_rate(network_id: str, serial: str,
     item["uploadBps"] = None if uploadKbps is None else uploadKbps * 125
 
 
-async def update_client_count(network_id: str, serial: str,
+async def update_client_count(org_id: str, network_id: str, serial: str,
                               local_config: dict[str, Any],
                               item: dict[str, Any]):
     req = (
         f'/networks/{network_id}/wireless/clientCountHistory'
         f'?timespan=300&resolution=300&deviceSerial={serial}')
-    resp = await query(local_config, req)
+    resp = await query(local_config, req, org_id=org_id)
     if len(resp) == 0:
         raise CheckException(
             'Client count history data for wireless with '
@@ -109,15 +172,16 @@ async def update_client_count(network_id: str, serial: str,
 async def get_channel_utilization(org_id: str, serial: str,
                                   local_config: dict[str, Any]
                                   ) -> list[dict[str, Any]]:
-    req = (
+    path = (
         f'/organizations/{org_id}/wireless/devices/channelUtilization/'
-        f'byDevice?interval=300&timespan=300&serials[]={serial}')
-    resp = await query(local_config, req)
-    if len(resp) == 0:
+        'byDevice')
+    channel_utilization = await query_serial(
+        local_config, path, 'interval=300&timespan=300', serial,
+        fields=CHANNEL_UTILIZATION_FIELDS)
+    if channel_utilization is None:
         raise CheckException(
             'Channel utilization data for wireless with '
             f'serial `{serial}` not ready to query', severity=Severity.LOW)
-    channel_utilization = resp[0]
     by_band = channel_utilization.get('byBand', [])
     items: list[dict[str, Any]] = []
     for band in by_band:
@@ -131,11 +195,52 @@ async def get_channel_utilization(org_id: str, serial: str,
     return items
 
 
+async def get_device(org_id: str, serial: str,
+                     local_config: dict[str, Any]) -> dict[str, Any]:
+    device = await lookup_device(org_id, serial, local_config)
+    if device is None:
+        raise Exception(f'Device with serial `{serial}` not found')
+
+    try:
+        datestr = device['configurationUpdatedAt']
+        configuration_updated_at = \
+            int(datetime.datetime.fromisoformat(datestr).timestamp())
+    except Exception:
+        configuration_updated_at = None
+
+    details = device.get('details', [])
+    running_software_version = None
+    for detail in details:
+        if detail.get('name') == 'Running software version':
+            try:
+                running_software_version = detail.get('value')
+            except Exception:
+                pass
+
+    return {
+        "name": serial,  # str (serial)
+        "organizationId": org_id,
+        "deviceName": device['name'],  # str
+        "mac": device['mac'],  # str
+        "networkId": device['networkId'],  # str
+        "productType": device['productType'],  # str
+        "model": device['model'],  # str
+        "address": device.get('address') or None,  # str?
+        "lat": float(device['lat']),  # float
+        "lng": float(device['lng']),  # float
+        "notes": device.get('notes') or None,  # str?
+        "configurationUpdatedAt": configuration_updated_at,  # int?
+        "firmware": device['firmware'],  # str
+        "runningSoftwareVersion": running_software_version,  # str?
+    }
+
+
 class CheckWireless(Check):
     key = 'wireless'
     unchanged_eol = 0
 
     @staticmethod
+    @checkrun(priority=4, bucket_data=True)
     async def run(asset: Asset, local_config: dict, config: dict) -> dict:
 
         interval = config.get('_interval', 300)
@@ -154,102 +259,94 @@ class CheckWireless(Check):
             raise Exception(
                 'Missing Serial in asset collector configuration')
 
-        req = f'/organizations/{org_id}/devices?serials[]={serial}'
-        resp = await query(local_config, req)
-
-        if len(resp) == 0:
-            raise Exception(f'Device with serial `{serial}` not found')
-
-        device = resp[0]
-
-        try:
-            datestr = device['configurationUpdatedAt']
-            configuration_updated_at = \
-                int(datetime.datetime.fromisoformat(datestr).timestamp())
-        except Exception:
-            configuration_updated_at = None
-
-        details = device.get('details', [])
-        running_software_version = None
-        for detail in details:
-            if detail.get('name') == 'Running software version':
-                try:
-                    running_software_version = detail.get('value')
-                except Exception:
-                    pass
-
-        network_id = device['networkId']
-        item = {
-            "name": serial,  # str (serial)
-            "organizationId": org_id,
-            "deviceName": device['name'],  # str
-            "mac": device['mac'],  # str
-            "networkId": network_id,  # str
-            "productType": device['productType'],  # str
-            "model": device['model'],  # str
-            "address": device.get('address') or None,  # str?
-            "lat": float(device['lat']),  # float
-            "lng": float(device['lng']),  # float
-            "notes": device.get('notes') or None,  # str?
-            "configurationUpdatedAt": configuration_updated_at,  # int?
-            "firmware": device['firmware'],  # str
-            "runningSoftwareVersion": running_software_version,  # str?
-        }
-        await update_status(org_id, serial, local_config, item)
-
-        network = {
-            "name": serial,
-            "networkId": network_id,
-        }
-
-        try:
-            await update_latency(network_id, serial, local_config, network)
-            assert network["avgLatencyMs"] is not None
-        except Exception:
-            await asyncio.sleep(16.0 + random.random()*5.0)  # Retry
-            await update_latency(network_id, serial, local_config, network)
-
-        try:
-            await update_rate(network_id, serial, local_config, network)
-            assert network["averageBps"] is not None
-            assert network["downloadBps"] is not None
-            assert network["uploadBps"] is not None
-        except Exception:
-            await asyncio.sleep(16.0 + random.random()*5.0)  # Retry
-            await update_rate(network_id, serial, local_config, network)
-
-        try:
-            await update_client_count(network_id, serial, local_config,
-                                      network)
-            assert network["clientCount"] is not None
-        except Exception:
-            await asyncio.sleep(16.0 + random.random()*5.0)  # Retry
-            await update_client_count(network_id, serial, local_config,
-                                      network)
-
-        try:
-            signal_quality = \
-                await get_signal_quality(network_id, serial, local_config)
-            assert signal_quality["snr"] is not None
-            assert signal_quality["rssi"] is not None
-        except Exception:
-            await asyncio.sleep(16.0 + random.random()*5.0)  # Retry
-            signal_quality = \
-                await get_signal_quality(network_id, serial, local_config)
-
+        # The device lookup is shared by the sections; the network ID is
+        # required for the network history requests
+        device = asyncio.ensure_future(
+            get_device(org_id, serial, local_config))
+
+        async def get_network_id() -> str:
+            return (await asyncio.shield(device))["networkId"]
+
+        async def device_section() -> list[dict[str, Any]]:
+            return [await asyncio.shield(device)]  # single item
+
+        async def status_section() -> dict[str, Any]:
+            # Merged into the device item
+            status: dict[str, Any] = {}
+            await update_status(org_id, serial, local_config, status)
+            return status
+
+        async def network_section() -> list[dict[str, Any]]:
+            network_id = await get_network_id()
+            network = {
+                "name": serial,
+                "networkId": network_id,
+            }
+            await gather_or_cancel(
+                repoll(
+                    lambda: update_latency(
+                        org_id, network_id, serial, local_config, network),
+                    lambda _: network["avgLatencyMs"] is not None),
+                repoll(
+                    lambda: update_rate(
+                        org_id, network_id, serial, local_config, network),
+                    lambda _: (
+                        network["averageBps"] is not None and
+                        network["downloadBps"] is not None and
+                        network["uploadBps"] is not None)),
+                repoll(
+                    lambda: update_client_count(
+                        org_id, network_id, serial, local_config, network),
+                    lambda _: network["clientCount"] is not None))
+            return [network]  # single item
+
+        async def signal_quality_section() -> list[dict[str, Any]]:
+            network_id = await get_network_id()
+            signal_quality = await repoll(
+                lambda: get_signal_quality(
+                    org_id, network_id, serial, local_config),
+                lambda signal_quality: (
+                    signal_quality["snr"] is not None and
+                    signal_quality["rssi"] is not None))
+            return [signal_quality]  # single item
+
+        async def channel_utilization_section() -> list[dict[str, Any]]:
+            return await repoll(lambda: get_channel_utilization(
+                org_id, serial, local_config))  # multi items
+
+        # Sections which are finished within the check time-out are returned
+        # even when others fail
         try:
-            channel_utilization = \
-                await get_channel_utilization(org_id, serial, local_config)
-        except Exception:
-            await asyncio.sleep(16.0 + random.random()*5.0)  # Retry
-            channel_utilization = \
-                await get_channel_utilization(org_id, serial, local_config)
-
-        state = {
-            "device": [item],  # single item
-            "network": [network],  # single item
-            "signalQuality": [signal_quality],  # single item
-            "channelUtilization": channel_utilization,  # multi items
-        }
+            state, errors = await gather_sections({
+                "device": device_section(),
+                "status": status_section(),
+                "network": network_section(),
+                "signalQuality": signal_quality_section(),
+                "channelUtilization": channel_utilization_section(),
+            }, budget())
+        finally:
+            if not device.done():
+                device.cancel()
+
+        # Without the device record, there is nothing to report; a missing
+        # status only leaves out the status fields of the device item
+        if "device" in errors:
+            raise errors["device"]
+        status = state.pop("status", None)
+        if status is not None:
+            state["device"][0].update(status)
+
+        if isinstance(errors.get("network"), NotFoundError) or \
+                isinstance(errors.get("signalQuality"), NotFoundError):
+            # The device has probably moved to another network; make sure
+            # the next run does not use the cached network ID
+            invalidate(org_id, serial)
+
+        if errors:
+            msg = '; '.join(
+                f'{name}: {str(e) or type(e).__name__}'
+                for name, e in errors.items())
+            raise IncompleteResultException(
+                f'Missing data, {msg}', state, severity=Severity.LOW)
 
         return state
@@ -0,0 +1,31 @@
+import functools
+from typing import Any, Awaitable, Callable, TypeVar, cast
+from libprobe.asset import Asset
+from .deadline import set_deadline
+from .metrics import current_check
+from .planner import dispatch
+from .scheduler import current_priority
+from .trace import traced
+
+
+F = TypeVar('F', bound=Callable[..., Awaitable[Any]])
+
+
+def checkrun(priority: int = 1,
+             bucket_data: bool = False) -> Callable[[F], F]:
+    """Decorator for a check run.
+
+    Sets the deadline, check name and priority used by the requests of the
+    run, waits for the planned start (see planner.dispatch) and records a
+    trace when TRACE is set.
+    """
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        async def wrapper(asset: Asset, local_config: dict, config: dict):
+            set_deadline(config)
+            current_check.set(asset.check)
+            current_priority.set(priority)
+            await dispatch(config.get('id'), asset.check, bucket_data)
+            return await func(asset, local_config, config)
+        return traced(cast(F, wrapper))
+    return decorator
@@ -0,0 +1,52 @@
+import asyncio
+import functools
+import time
+from typing import Any
+from .query import query
+from .repoll import WAVE_STEP, repolling
+
+
+# Network wide results are shared by all devices in the network for the
+# duration of one Meraki (5 minute) bucket.
+BUCKET = 300
+
+# Results with the time the request was started
+_results: dict[tuple[Any, str, int], tuple[float, asyncio.Future]] = {}
+
+
+async def _fetch(local_config: dict, org_id: str,
+                 req: str) -> dict[str, dict[str, Any]]:
+    resp = await query(local_config, req, org_id=org_id)
+    return {
+        row['serial']: row
+        for row in resp if isinstance(row, dict) and 'serial' in row}
+
+
+def _on_done(key: tuple[Any, str, int], fut: asyncio.Future):
+    entry = _results.get(key)
+    if entry is not None and entry[1] is fut and (
+            fut.cancelled() or fut.exception() is not None):
+        # Make sure the next request will try again
+        del _results[key]
+
+
+async def query_network(local_config: dict, org_id: str,
+                        req: str) -> dict[str, dict[str, Any]]:
+    """Query a network wide endpoint which returns one row per device.
+
+    The request is made once per bucket for all devices in the network.
+    A re-poll requests fresh rows, shared by the re-polls in the same wave.
+    Returns the rows by serial.
+    """
+    now = time.time()
+    bucket = int(now // BUCKET)
+    key = (local_config.get('secret'), req, bucket)
+    entry = _results.get(key)
+    if entry is None or (repolling.get() and now - entry[0] >= WAVE_STEP):
+        for k in [k for k in _results if k[2] != bucket]:
+            del _results[k]
+        fut = asyncio.ensure_future(_fetch(local_config, org_id, req))
+        fut.add_done_callback(functools.partial(_on_done, key))
+        entry = _results[key] = now, fut
+    # Shield the shared request from a cancelled (timed out) check
+    return await asyncio.shield(entry[1])
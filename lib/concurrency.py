@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import os
+import statistics
+import time
+from collections import deque
+from .metrics import set_gauge
+from .scheduler import Scheduler
+
+
+# The number of concurrent API requests is adjusted at run time (additive
+# increase, multiplicative decrease) between MIN_REQUESTS and MAX_REQUESTS,
+# starting at INITIAL_REQUESTS.
+MAX_REQUESTS = int(os.getenv('MAX_REQUESTS', '20'))
+MIN_REQUESTS = 1
+INITIAL_REQUESTS = min(5, MAX_REQUESTS)
+
+# The limit is lowered by this factor after a 429 response, a time-out or
+# when the p95 latency exceeds LATENCY_FACTOR times the baseline latency.
+BACKOFF = 0.7
+LATENCY_FACTOR = 2.0
+
+# The p95 latency is computed for every LATENCY_WINDOW responses.
+LATENCY_WINDOW = 50
+
+# The baseline is the lowest p95 latency seen; it follows a higher p95 with
+# this weight so it adapts when the API gets slower for a longer time.
+BASELINE_ALPHA = 0.05
+
+
+class AdaptiveLimit:
+    def __init__(self, scheduler: Scheduler):
+        self.scheduler = scheduler
+        self.window = float(scheduler.limit)
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.samples = 0
+        self.p95: float | None = None
+        self.baseline: float | None = None
+        self.slow = False
+        self.decreased_at = 0.0
+        self._gauge()
+
+    def _gauge(self):
+        set_gauge('meraki_concurrency_limit', self.scheduler.limit)
+
+    def _set(self, window: float):
+        self.window = min(max(window, MIN_REQUESTS), MAX_REQUESTS)
+        limit = int(self.window)
+        if limit != self.scheduler.limit:
+            self.scheduler.set_limit(limit)
+            self._gauge()
+
+    def _decrease(self, reason: str):
+        # Responses to requests which were sent before the last decrease
+        # do not lower the limit again
+        now = time.monotonic()
+        if now - self.decreased_at < (self.p95 or 1.0):
+            return
+        self.decreased_at = now
+        self._set(self.window * BACKOFF)
+        logging.debug(
+            f'concurrency limit {self.scheduler.limit} ({reason})')
+
+    def _observe(self, latency: float) -> bool:
+        # Returns True when the p95 latency for a window of responses is
+        # found to be risen
+        self.latencies.append(latency)
+        self.samples += 1
+        if self.samples % LATENCY_WINDOW:
+            return False
+        p95 = self.p95 = statistics.quantiles(self.latencies, n=20)[-1]
+        if self.baseline is None or p95 < self.baseline:
+            self.baseline = p95
+        else:
+            self.baseline += BASELINE_ALPHA * (p95 - self.baseline)
+        self.slow = p95 > LATENCY_FACTOR * self.baseline
+        return self.slow
+
+    def on_response(self, status: int, latency: float):
+        if self._observe(latency):
+            self._decrease('latency')
+        if status == 429:
+            self._decrease('throttled')
+        elif status // 100 == 2 and not self.slow and \
+                self.scheduler.active >= self.scheduler.limit:
+            # Only increase while the limit is in use; by one request for
+            # each `limit` successful responses
+            self._set(self.window + 1.0 / self.window)
+
+    def on_error(self, e: BaseException):
+        # Also raised by aiohttp for a socket read time-out
+        if isinstance(e, asyncio.TimeoutError):
+            self._decrease('time-out')
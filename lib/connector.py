@@ -1,5 +1,16 @@
 import aiohttp
 import asyncio
+from .trace import trace_configs
+
+
+# Keep-alive connections which are idle for longer than this number of
+# seconds are closed.
+KEEPALIVE_TIMEOUT = 30.0
+
+# Resolved hosts are cached for this number of seconds.
+DNS_CACHE_TTL = 300
+
+_sessions: dict[str, aiohttp.ClientSession] = {}
 
 
 def get_connector(
@@ -10,8 +21,50 @@ def get_connector(
 
     return aiohttp.TCPConnector(
         limit=100,  # 100 is default
-        use_dns_cache=False,
+        use_dns_cache=True,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
         enable_cleanup_closed=True,
-        force_close=True,
         loop=loop,
     )
+
+
+def get_session(api_key: str) -> aiohttp.ClientSession:
+    """Return a long lived session for the given API key.
+
+    Sessions (and thus connections) are shared by all checks using the same
+    API key and are re-used for the lifetime of the probe.
+    """
+    session = _sessions.get(api_key)
+    if session is None or session.closed:
+        headers = {
+            'X-Cisco-Meraki-API-Key': api_key,
+        }
+        session = _sessions[api_key] = aiohttp.ClientSession(
+            connector=get_connector(),
+            headers=headers,
+            trace_configs=trace_configs())
+    return session
+
+
+async def close_sessions():
+    sessions = list(_sessions.values())
+    _sessions.clear()
+    for session in sessions:
+        await session.close()
+
+
+async def close_sessions_on_stop():
+    """Close the sessions when this task is cancelled; libprobe cancels all
+    tasks when the probe is stopped as a service."""
+    try:
+        await asyncio.Future()
+    finally:
+        # The event loop is closed right after the tasks are cancelled, so
+        # the close must not wait for the event loop; the connections are
+        # closed synchronously instead
+        sessions = list(_sessions.values())
+        _sessions.clear()
+        for session in sessions:
+            if session.connector is not None:
+                session.connector._close()
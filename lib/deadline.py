@@ -0,0 +1,32 @@
+import os
+import time
+from contextvars import ContextVar
+
+
+# Same as the check time-out used by libprobe; the check time-out is 80% of
+# the interval with MAX_CHECK_TIMEOUT as absolute maximum.
+MAX_CHECK_TIMEOUT = float(os.getenv('MAX_CHECK_TIMEOUT', 300))
+
+# Time reserved to build and return a (partial) result before the check
+# time-out.
+RESULT_MARGIN = 5.0
+
+_deadline: ContextVar[float | None] = ContextVar('deadline', default=None)
+
+
+def set_deadline(config: dict):
+    interval = config.get('_interval', 300)
+    timeout = min(0.8 * interval, MAX_CHECK_TIMEOUT)
+    _deadline.set(time.monotonic() + timeout)
+
+
+def time_left() -> float:
+    deadline = _deadline.get()
+    if deadline is None:
+        return MAX_CHECK_TIMEOUT
+    return deadline - time.monotonic()
+
+
+def budget() -> float:
+    """Time left for requests, leaving RESULT_MARGIN to return a result."""
+    return max(time_left() - RESULT_MARGIN, 0.0)
@@ -0,0 +1,182 @@
+import asyncio
+import datetime
+import functools
+import logging
+import os
+import time
+from typing import Any
+from .batch import query_serial
+from .cache import TTLCache
+from .persist import put, restore
+from .projection import Fields, project
+from .query import query_pages
+
+
+# Device inventory (network ID, name, model, mac, location, firmware etc.)
+# rarely changes and is cached for INVENTORY_TTL seconds.
+INVENTORY_TTL = float(os.getenv('INVENTORY_TTL', '3600'))
+INVENTORY_MAX_SIZE = int(os.getenv('INVENTORY_MAX_SIZE', '10000'))
+
+# The wireless inventory of an organization is fetched in full once per
+# INVENTORY_TTL. In between, only devices with a configuration change since
+# the previous refresh are requested, once per INVENTORY_REFRESH seconds.
+INVENTORY_REFRESH = float(os.getenv('INVENTORY_REFRESH', '300'))
+
+# Overlap (in seconds) between incremental refreshes to allow for clock skew
+SYNC_OVERLAP = 60
+
+# Only these fields are kept in the cache
+DEVICE_FIELDS: Fields = (
+    'serial',
+    'name',
+    'mac',
+    'networkId',
+    'productType',
+    'model',
+    'address',
+    'lat',
+    'lng',
+    'notes',
+    'configurationUpdatedAt',
+    'firmware',
+    ('details', ('name', 'value')),
+)
+
+_devices = TTLCache(INVENTORY_TTL, INVENTORY_MAX_SIZE)
+
+
+class Sync:
+    def __init__(self, full_ts: float = 0.0, ts: float = 0.0):
+        self.full_ts = full_ts  # start of last full sync
+        self.ts = ts  # start of last successful sync
+        # A next (full or incremental) sync is not attempted before this
+        # time, also when the last attempt has failed
+        self.next_ts = ts + INVENTORY_REFRESH if ts else 0.0
+        self.fut: asyncio.Future | None = None
+
+    def due(self) -> bool:
+        return time.time() >= self.next_ts
+
+
+_syncs: dict[tuple[Any, str], Sync] = {}
+
+# Monitored serials by organization, with the time of the last lookup; only
+# these devices are kept from the inventory of the organization
+_monitored: dict[str, dict[str, float]] = {}
+
+# Sync state by organization, restored from the cache file
+_restored: dict[str, tuple[float, float]] = {}
+
+
+@restore('device')
+def _restore_device(key: list, device: dict[str, Any], ts: float):
+    ttl = INVENTORY_TTL - (time.time() - ts)
+    if ttl > 0.0:
+        _devices.set(tuple(key), device, ttl)
+
+
+@restore('sync')
+def _restore_sync(org_id: str, value: list, ts: float):
+    full_ts, ts = value
+    _restored[org_id] = full_ts, ts
+
+
+def update_device(org_id: str, device: dict[str, Any]):
+    """Store a device record from a (fresh) inventory response."""
+    # This is where a configuration change invalidates the cached record:
+    # the incremental refresh requests the devices with a newer
+    # configurationUpdatedAt and their records replace the cached ones
+    key = (org_id, device.get('serial'))
+    cached = _devices.get(key)
+    if cached is not None and cached.get('configurationUpdatedAt') != \
+            device.get('configurationUpdatedAt'):
+        logging.debug(f'configuration changed for device {key}')
+    _devices.set(key, device)
+    put('device', key, device)
+
+
+def invalidate(org_id: str, serial: str):
+    _devices.pop((org_id, serial))
+    put('device', (org_id, serial), None)
+
+
+def _isoformat(ts: float) -> str:
+    dt = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _is_monitored(org_id: str, serial: str | None, ts: float) -> bool:
+    monitored = _monitored.get(org_id, {})
+    return serial in monitored and ts - monitored[serial] < 2 * INVENTORY_TTL
+
+
+async def _sync(local_config: dict, org_id: str, sync: Sync):
+    ts = time.time()
+    # The full sync starts before the devices from the last full sync expire
+    full = ts - sync.full_ts >= INVENTORY_TTL - INVENTORY_REFRESH
+    req = f'/organizations/{org_id}/devices?productTypes[]=wireless'
+    if not full:
+        after = _isoformat(sync.ts - SYNC_OVERLAP)
+        req = f'{req}&configurationUpdatedAfter={after}'
+
+    # On failure, the next attempt is made after INVENTORY_REFRESH seconds;
+    # devices are looked up by serial in the meantime
+    sync.next_ts = ts + INVENTORY_REFRESH
+    n = 0
+    async for page in query_pages(local_config, req, org_id=org_id,
+                                  per_page=1000, fields=DEVICE_FIELDS):
+        for device in page:
+            if _is_monitored(org_id, device.get('serial'), ts):
+                update_device(org_id, device)
+                n += 1
+
+    if full:
+        sync.full_ts = ts
+    sync.ts = ts
+    put('sync', org_id, (sync.full_ts, ts))
+    logging.debug(
+        f'inventory {"sync" if full else "refresh"} for organization '
+        f'{org_id}: {n} device(s)')
+
+
+def _on_sync_done(org_id: str, sync: Sync, fut: asyncio.Future):
+    sync.fut = None
+    if not fut.cancelled() and fut.exception() is not None:
+        e = fut.exception()
+        msg = str(e) or type(e).__name__
+        logging.warning(f'inventory sync failed for {org_id}: {msg}')
+
+
+def refresh(org_id: str, local_config: dict):
+    """Start a background sync of the wireless inventory of an organization
+    when due."""
+    key = (local_config.get('secret'), org_id)
+    sync = _syncs.get(key)
+    if sync is None:
+        sync = _syncs[key] = Sync(*_restored.get(org_id, ()))
+    if sync.fut is None and sync.due():
+        fut = sync.fut = asyncio.ensure_future(
+            _sync(local_config, org_id, sync))
+        fut.add_done_callback(
+            functools.partial(_on_sync_done, org_id, sync))
+
+
+async def lookup_device(org_id: str, serial: str,
+                        local_config: dict) -> dict[str, Any] | None:
+    """Return the inventory record for a device, None if not found.
+
+    The inventory of the organization is synchronized in the background;
+    devices which are not (yet) cached are requested by serial.
+    """
+    _monitored.setdefault(org_id, {})[serial] = time.time()
+    refresh(org_id, local_config)
+
+    device = _devices.get((org_id, serial))
+    if device is None:
+        path = f'/organizations/{org_id}/devices'
+        device = await query_serial(local_config, path, '', serial,
+                                    prefetch=False)
+        if device is not None:
+            device = project(device, DEVICE_FIELDS)
+            update_device(org_id, device)
+    return device
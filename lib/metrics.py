@@ -0,0 +1,152 @@
+import logging
+import os
+import re
+from aiohttp import web
+from contextvars import ContextVar
+
+
+# Expose metrics in Prometheus text format on this port; disabled when not
+# set.
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_re_template = (
+    (re.compile(r'^/organizations/[^/?]+'), '/organizations/{organizationId}'),
+    (re.compile(r'^/networks/[^/?]+'), '/networks/{networkId}'),
+    (re.compile(r'^/devices/[^/?]+'), '/devices/{serial}'),
+)
+
+current_check: ContextVar[str] = ContextVar('current_check', default='')
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, le in enumerate(BUCKETS):
+            if value <= le:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+request_duration: dict[str, Histogram] = {}
+queue_wait: dict[str, Histogram] = {}
+requests_total: dict[tuple[str, int], int] = {}
+response_bytes: dict[str, int] = {}
+check_requests: dict[str, int] = {}
+check_wait: dict[tuple[str, str], float] = {}
+gauges: dict[str, float] = {}
+
+
+def template(req: str) -> str:
+    """Return the endpoint template for a request path (without base)."""
+    path = req.split('?', 1)[0]
+    for pattern, repl in _re_template:
+        path = pattern.sub(repl, path, count=1)
+    return path
+
+
+def _observe(hists: dict[str, Histogram], endpoint: str, value: float):
+    hist = hists.get(endpoint)
+    if hist is None:
+        hist = hists[endpoint] = Histogram()
+    hist.observe(value)
+
+
+def on_request(endpoint: str, status: int, duration: float, wait: float,
+               size: int):
+    _observe(request_duration, endpoint, duration)
+    _observe(queue_wait, endpoint, wait)
+    key = (endpoint, status)
+    requests_total[key] = requests_total.get(key, 0) + 1
+    response_bytes[endpoint] = response_bytes.get(endpoint, 0) + size
+    check = current_check.get()
+    check_requests[check] = check_requests.get(check, 0) + 1
+
+
+def on_wait(reason: str, seconds: float):
+    """Register time a check spends waiting for a retry or re-poll."""
+    key = (current_check.get(), reason)
+    check_wait[key] = check_wait.get(key, 0.0) + seconds
+
+
+def set_gauge(name: str, value: float):
+    gauges[name] = value
+
+
+def _hist_lines(name: str, help: str, hists: dict[str, Histogram]):
+    yield f'# HELP {name} {help}'
+    yield f'# TYPE {name} histogram'
+    for endpoint, hist in hists.items():
+        lbl = f'endpoint="{endpoint}"'
+        for le, count in zip(BUCKETS, hist.counts):
+            yield f'{name}_bucket{{{lbl},le="{le}"}} {count}'
+        yield f'{name}_bucket{{{lbl},le="+Inf"}} {hist.count}'
+        yield f'{name}_sum{{{lbl}}} {hist.sum}'
+        yield f'{name}_count{{{lbl}}} {hist.count}'
+
+
+def render() -> str:
+    lines = [
+        *_hist_lines(
+            'meraki_request_duration_seconds',
+            'Meraki API request latency including reading the body.',
+            request_duration),
+        *_hist_lines(
+            'meraki_queue_wait_seconds',
+            'Time waiting for a rate limit token and a request slot.',
+            queue_wait),
+        '# HELP meraki_requests_total Meraki API responses by status.',
+        '# TYPE meraki_requests_total counter',
+        *(
+            f'meraki_requests_total{{endpoint="{endpoint}",'
+            f'status="{status}"}} {count}'
+            for (endpoint, status), count in requests_total.items()),
+        '# HELP meraki_response_bytes_total Bytes received.',
+        '# TYPE meraki_response_bytes_total counter',
+        *(
+            f'meraki_response_bytes_total{{endpoint="{endpoint}"}} {size}'
+            for endpoint, size in response_bytes.items()),
+        '# HELP meraki_check_requests_total API requests by check.',
+        '# TYPE meraki_check_requests_total counter',
+        *(
+            f'meraki_check_requests_total{{check="{check}"}} {count}'
+            for check, count in check_requests.items()),
+        '# HELP meraki_check_wait_seconds_total '
+        'Time checks spend waiting for retries.',
+        '# TYPE meraki_check_wait_seconds_total counter',
+        *(
+            f'meraki_check_wait_seconds_total{{check="{check}",'
+            f'reason="{reason}"}} {seconds}'
+            for (check, reason), seconds in check_wait.items()),
+    ]
+    # Gauges with labels are stored by name including the labels
+    types = set()
+    for name, value in sorted(gauges.items()):
+        base = name.split('{', 1)[0]
+        if base not in types:
+            types.add(base)
+            lines.append(f'# TYPE {base} gauge')
+        lines.append(f'{name} {value}')
+    lines.append('')
+    return '\n'.join(lines)
+
+
+async def _handle(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type='text/plain',
+                        charset='utf-8')
+
+
+async def serve_metrics(port: int = METRICS_PORT):
+    app = web.Application()
+    app.router.add_get('/metrics', _handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, port=port)
+    await site.start()
+    logging.info(f'metrics available on port {port} (/metrics)')
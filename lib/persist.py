@@ -0,0 +1,123 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Callable
+
+
+# Keep the inventory, inventory sync state, shard hosts and the collected
+# backfill windows in this file so the first cycle after a restart is not a
+# cold one; disabled when not set.
+CACHE_FILE = os.getenv('CACHE_FILE')
+
+# Pending entries are appended to the file every FLUSH_INTERVAL seconds.
+FLUSH_INTERVAL = 10.0
+
+# The file is rewritten with only the live entries when it has more than
+# COMPACT_FACTOR times the number of live entries.
+COMPACT_FACTOR = 3
+
+Restore = Callable[[Any, Any, float], None]
+
+_restore: dict[str, Restore] = {}
+_path: str | None = None
+_live: dict[str, str] = {}
+_pending: list[str] = []
+_lines = 0
+
+
+def restore(kind: str) -> Callable[[Restore], Restore]:
+    """Register a function which restores an entry of the given kind; it is
+    called with the key, value and the (wall clock) time it was stored."""
+    def wrapper(func: Restore) -> Restore:
+        _restore[kind] = func
+        return func
+    return wrapper
+
+
+def put(kind: str, key: Any, value: Any):
+    """Store an entry; the last entry for a kind and key wins. Use None as
+    value to remove an entry."""
+    if _path is None:
+        return
+    ident = json.dumps([kind, key])
+    line = json.dumps([kind, key, value, time.time()])
+    if value is None:
+        _live.pop(ident, None)
+    else:
+        _live[ident] = line
+    _pending.append(line)
+
+
+def load(path: str):
+    """Load the cache file and use it for the next entries."""
+    global _path, _lines
+    _path = path
+    _live.clear()
+    _pending.clear()
+    _lines = 0
+    try:
+        fp = open(path)
+    except FileNotFoundError:
+        return
+    with fp:
+        for line in fp:
+            _lines += 1
+            try:
+                kind, key, value, ts = json.loads(line)
+                ident = json.dumps([kind, key])
+                if value is None:
+                    _live.pop(ident, None)
+                else:
+                    _live[ident] = line.rstrip('\n')
+            except Exception:
+                continue  # for example a partly written last line
+
+    n = 0
+    for line in _live.values():
+        kind, key, value, ts = json.loads(line)
+        func = _restore.get(kind)
+        if func is not None:
+            func(key, value, ts)
+            n += 1
+    logging.info(f'restored {n} cache entries from {path}')
+
+
+def _append(lines: list[str]):
+    global _lines
+    assert _path
+    with open(_path, 'a') as fp:
+        fp.write(''.join(f'{line}\n' for line in lines))
+    _lines += len(lines)
+
+
+def _compact():
+    global _lines
+    assert _path
+    tmp = f'{_path}.tmp'
+    with open(tmp, 'w') as fp:
+        fp.write(''.join(f'{line}\n' for line in _live.values()))
+    os.replace(tmp, _path)
+    _lines = len(_live)
+
+
+def flush():
+    if _path is None or not _pending:
+        return
+    lines = _pending[:]
+    _pending.clear()
+    try:
+        if _lines + len(lines) > COMPACT_FACTOR * max(len(_live), 1000):
+            _compact()
+        else:
+            _append(lines)
+    except Exception as e:
+        msg = str(e) or type(e).__name__
+        logging.error(f'failed to write cache file {_path}: {msg}')
+
+
+async def flush_loop():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        flush()
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import time
+from . import ratelimit, repoll
+from .deadline import time_left
+from .metrics import check_requests, on_wait, set_gauge
+from .trace import span
+
+
+# Spread the check runs for each organization so the planned requests stay
+# within the organization rate limit; set DISPATCH=0 to disable.
+DISPATCH = os.getenv('DISPATCH', '1') != '0'
+
+# A run is never delayed for more than this part of the check time-out.
+MAX_DELAY_FACTOR = 0.5
+
+# Planned load is reported for slots of this number of seconds.
+SLOT = 10
+
+
+class Plan:
+    def __init__(self):
+        self.next_free = 0.0
+        self.load: dict[int, float] = {}  # planned requests by slot
+
+
+_plans: dict[str, Plan] = {}
+_runs: dict[str, int] = {}
+
+
+def _cost(check: str) -> float:
+    # Average number of requests for a run of the check; a batched request
+    # is counted for the check which sends the batch
+    runs = _runs.get(check, 0)
+    _runs[check] = runs + 1
+    if not runs:
+        return 1.0
+    return max(check_requests.get(check, 0) / runs, 0.1)
+
+
+def _report(org_id: str, plan: Plan, now: float):
+    # Peak to mean ratio of the planned requests per slot over the last
+    # interval; 1.0 is a perfectly flat load
+    first = int((now - repoll.BUCKET) // SLOT)
+    for slot in [slot for slot in plan.load if slot < first]:
+        del plan.load[slot]
+    total = sum(plan.load.values())
+    if total:
+        mean = total / (repoll.BUCKET / SLOT)
+        set_gauge(
+            f'meraki_dispatch_peak_to_mean{{organization="{org_id}"}}',
+            max(plan.load.values()) / mean)
+
+
+async def dispatch(org_id: str | None, check: str,
+                   bucket_data: bool = False):
+    """Wait for the planned start of a check run. Checks for bucket data
+    start after the data of the last bucket is ready."""
+    if not DISPATCH:
+        return
+
+    org_id = org_id or ''
+    plan = _plans.get(org_id)
+    if plan is None:
+        plan = _plans[org_id] = Plan()
+
+    now = time.time()
+    start = max(now, plan.next_free)
+    if bucket_data:
+        # Data for the last bucket is not ready until DATA_READY_LAG seconds
+        # after the bucket is closed
+        start = max(start, now - now % repoll.BUCKET + repoll.DATA_READY_LAG)
+    start = min(start, now + time_left() * MAX_DELAY_FACTOR)
+
+    cost = _cost(check)
+    # Runs which cannot be delayed any further still book the budget; the
+    # plan never looks further ahead than one interval
+    plan.next_free = min(
+        max(plan.next_free, start) + cost / ratelimit.RATE_LIMIT_ORG,
+        now + repoll.BUCKET)
+    slot = int(start // SLOT)
+    plan.load[slot] = plan.load.get(slot, 0.0) + cost
+    _report(org_id, plan, now)
+
+    delay = start - now
+    if delay > 0.0:
+        on_wait('dispatch', delay)
+        with span('dispatch wait'):
+            await asyncio.sleep(delay)
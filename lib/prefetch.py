@@ -0,0 +1,47 @@
+import asyncio
+import logging
+import os
+import time
+from .batch import BATCH_MAX_SERIALS, fetch_rows
+from .metrics import current_check
+from .repoll import BUCKET, DATA_READY_LAG
+from .scheduler import current_priority
+from .snapshot import Endpoint, EndpointKey, endpoints, publish
+
+
+# Prefetch organization wide data once per interval; set PREFETCH=0 to
+# disable.
+PREFETCH = os.getenv('PREFETCH', '1') != '0'
+
+
+async def _prefetch(key: EndpointKey, endpoint: Endpoint):
+    ts = time.time()
+    serials = list(endpoint.serials)
+    size = BATCH_MAX_SERIALS
+    rows = {}
+    try:
+        for chunk in await asyncio.gather(*(
+                fetch_rows(endpoint.local_config, endpoint.path,
+                           endpoint.params, serials[i:i + size],
+                           endpoint.per_page)
+                for i in range(0, len(serials), size))):
+            rows.update(chunk)
+    except Exception as e:
+        msg = str(e) or type(e).__name__
+        logging.warning(f'prefetch failed for {endpoint.path}: {msg}')
+    else:
+        publish(key, rows, ts)
+
+
+async def prefetch_loop():
+    """Prefetch registered organization endpoints shortly after each Meraki
+    bucket is closed. Checks are then served from the snapshot."""
+    current_check.set('prefetch')
+    # The snapshots serve most checks
+    current_priority.set(4)
+    while True:
+        now = time.time()
+        await asyncio.sleep(BUCKET - (now - DATA_READY_LAG) % BUCKET)
+        await asyncio.gather(*(
+            _prefetch(key, endpoint)
+            for key, endpoint in endpoints().items()))
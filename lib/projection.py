@@ -0,0 +1,43 @@
+import functools
+from typing import Any, TypeAlias, Union
+
+
+# A projection is a tuple with field names to keep; use a tuple
+# (name, projection) to project a nested object (or list of objects).
+#
+# Example: ('serial', ('byBand', ('band', ('wifi', ('percentage',)))))
+Fields: TypeAlias = tuple[Union[str, tuple[str, 'Fields']], ...]
+
+
+@functools.cache
+def split_fields(
+        fields: Fields) -> tuple[tuple[str, ...],
+                                 tuple[tuple[str, Fields], ...]]:
+    """Return the plain field names and nested projections."""
+    plain = tuple(f for f in fields if isinstance(f, str))
+    nested = tuple(f for f in fields if not isinstance(f, str))
+    return plain, nested
+
+
+def _project(obj: dict[str, Any], plain: tuple[str, ...],
+             nested: tuple[tuple[str, Fields], ...]) -> dict[str, Any]:
+    out = {k: obj[k] for k in plain if k in obj}
+    for name, sub in nested:
+        if name in obj:
+            out[name] = project(obj[name], sub)
+    return out
+
+
+def project(data: Any, fields: Fields) -> Any:
+    """Return a copy of data with only the given fields.
+
+    Lists are projected item by item, missing fields are left out.
+    """
+    plain, nested = split_fields(fields)
+    if isinstance(data, list):
+        return [
+            _project(obj, plain, nested) if isinstance(obj, dict) else obj
+            for obj in data]
+    if isinstance(data, dict):
+        return _project(data, plain, nested)
+    return data
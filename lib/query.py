@@ -1,33 +1,166 @@
 import asyncio
-import aiohttp
-import os
+import logging
+import re
+import time
+from typing import Any, AsyncIterator
 from libprobe.exceptions import CheckException, Severity
-from .connector import get_connector
+from .breaker import get_circuit
+from .concurrency import INITIAL_REQUESTS, MAX_REQUESTS, AdaptiveLimit
+from .connector import get_session
+from .deadline import time_left
+from .metrics import on_request, on_wait, set_gauge, template
+from .projection import Fields, project
+from .ratelimit import acquire, throttle
+from .scheduler import Scheduler
+from .shard import base_url, forget, learn
+from .trace import span
 
 
-max_requests = int(os.getenv('MAX_REQUESTS', '5'))
-sem = asyncio.Semaphore(max_requests)
+scheduler = Scheduler(INITIAL_REQUESTS, 'meraki_queue_depth')
+limit = AdaptiveLimit(scheduler)
+set_gauge('meraki_max_requests', MAX_REQUESTS)
 
+BASE_URL = 'https://api.meraki.com/api/v1'
 
-async def query(local_config: dict, req: str):
+_re_org = re.compile(r'^/organizations/([^/?]+)')
+
+
+class NotFoundError(Exception):
+    pass
+
+
+def _api_key(local_config: dict) -> str:
     api_key = local_config.get('secret')
     assert api_key, (
         'API key is missing, '
         'please provide the API key as `secret` in the appliance config')
+    return api_key
+
+
+def _org_id(req: str, org_id: str | None) -> str | None:
+    if org_id is None:
+        m = _re_org.match(req)
+        if m:
+            return m.group(1)
+    return org_id
+
+
+def _retry_after(headers) -> float:
+    try:
+        return max(float(headers['Retry-After']), 1.0)
+    except Exception:
+        return 1.0
+
+
+async def _get(api_key: str, uri: str, org_id: str | None,
+               endpoint: str) -> tuple[Any, str | None]:
+    session = get_session(api_key)
+    circuit = get_circuit(api_key, org_id, endpoint)
+    throttled = False
+    while True:
+        # Fail fast for a broken API key or endpoint before taking a token
+        # and request slot which are then available for healthy tenants
+        probe = circuit.allow()
+        status = None
+        start = time.monotonic()
+        try:
+            # After a 429 response this waits for the paused bucket
+            with span('throttle' if throttled else 'rate limit'):
+                await acquire(api_key, org_id)
+            with span('slot wait'):
+                await scheduler.acquire((api_key, org_id))
+            try:
+                ts = time.monotonic()
+                with span('request', endpoint=endpoint):
+                    async with session.get(uri, ssl=True) as resp:
+                        with span('body read'):
+                            body = await resp.read()
+                        status = resp.status
+                        limit.on_response(status, time.monotonic() - ts)
+                        circuit.on_status(status, resp.reason)
+                        if resp.history:
+                            learn(org_id, resp.url, BASE_URL)
+                        on_request(endpoint, status, time.monotonic() - ts,
+                                   ts - start, len(body))
+                        if status == 404:
+                            raise NotFoundError(
+                                f'response status code: {status}; '
+                                f'reason: {resp.reason}')
+                        if status != 429:
+                            assert status // 100 == 2, (
+                                f'response status code: {status}; '
+                                f'reason: {resp.reason}')
+
+                            with span('json decode'):
+                                data = await resp.json()
+                            links = resp.links
+                            next_url = links.get('next', {}).get('url')
+                            return data, \
+                                None if next_url is None else str(next_url)
+
+                        retry_after = _retry_after(resp.headers)
+            finally:
+                scheduler.release()
+        except BaseException as e:
+            if status is None:
+                limit.on_error(e)
+                circuit.on_error(e, probe)
+                failed = not isinstance(e, asyncio.CancelledError)
+            else:
+                failed = status >= 500
+            if failed and not uri.startswith(BASE_URL):
+                # Use the default host for the next request
+                forget(org_id)
+            raise
+
+        if retry_after >= time_left():
+            raise CheckException("(429) Too Many Requests",
+                                 severity=Severity.LOW)
+
+        # The request is sent again as soon as the (paused) bucket for the
+        # organization or API key has a token available
+        logging.debug(f'(429) Too Many Requests; retry after {retry_after}s')
+        throttle(api_key, org_id, retry_after)
+        on_wait('throttle', retry_after)
+        throttled = True
+
+
+async def query(local_config: dict, req: str, org_id: str | None = None):
+    api_key = _api_key(local_config)
+    org_id = _org_id(req, org_id)
+    uri = f'{base_url(org_id, BASE_URL)}{req}'
+    data, _ = await _get(api_key, uri, org_id, template(req))
+    return data
+
+
+async def query_pages(local_config: dict, req: str,
+                      org_id: str | None = None,
+                      per_page: int | None = None,
+                      fields: Fields | None = None
+                      ) -> AsyncIterator[list[dict[str, Any]]]:
+    """Yield the rows for each page of a paginated endpoint.
+
+    Pages are followed using the `Link: rel=next` response header. The next
+    page is fetched while the caller processes the current page. For
+    endpoints which return an object, the `items` are yielded. When `fields`
+    is given, rows only contain the projected fields; this is meant for rows
+    which are cached, such as the device inventory.
+    """
+    api_key = _api_key(local_config)
+    org_id = _org_id(req, org_id)
+    if per_page is not None:
+        req = f'{req}{"&" if "?" in req else "?"}perPage={per_page}'
 
-    headers = {
-        'X-Cisco-Meraki-API-Key': api_key,
-    }
-    uri = f'https://api.meraki.com/api/v1{req}'
-    async with sem:
-        async with aiohttp.ClientSession(connector=get_connector()) as session:
-            async with session.get(uri, headers=headers, ssl=True) as resp:
-                if resp.status == 429:
-                    raise CheckException("(429) Too Many Requests",
-                                         severity=Severity.LOW)
-                assert resp.status // 100 == 2, (
-                    f'response status code: {resp.status}; '
-                    f'reason: {resp.reason}')
-
-                data = await resp.json()
-                return data
+    endpoint = template(req)
+    uri = f'{base_url(org_id, BASE_URL)}{req}'
+    fut = asyncio.ensure_future(_get(api_key, uri, org_id, endpoint))
+    try:
+        while fut is not None:
+            data, next_url = await fut
+            fut = None if next_url is None else asyncio.ensure_future(
+                _get(api_key, next_url, org_id, endpoint))
+            rows = data.get('items', []) if isinstance(data, dict) else data
+            yield rows if fields is None else project(rows, fields)
+    finally:
+        if fut is not None:
+            fut.cancel()
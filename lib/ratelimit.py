@@ -0,0 +1,78 @@
+import asyncio
+import os
+import time
+from .scheduler import Scheduler, Tenant
+
+
+# Meraki allows 10 requests per second for each organization and 100
+# requests per second for each source IP address.
+RATE_LIMIT_ORG = float(os.getenv('RATE_LIMIT_ORG', '10'))
+RATE_LIMIT_KEY = float(os.getenv('RATE_LIMIT_KEY', '100'))
+
+ORG_QUEUE_DEPTH = 'meraki_org_rate_limit_queue_depth'
+KEY_QUEUE_DEPTH = 'meraki_key_rate_limit_queue_depth'
+
+
+class TokenBucket:
+    def __init__(self, rate: float, name: str):
+        self.rate = rate
+        self.burst = max(rate, 1.0)
+        self.tokens = self.burst
+        self.ts = time.monotonic()
+        self.paused_until = 0.0
+        # Waiters take tokens one at a time, in fair order
+        self.lock = Scheduler(1, name)
+
+    async def acquire(self, tenant: Tenant):
+        async with self.lock.slot(tenant):
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(
+                    self.burst,
+                    self.tokens + (now - self.ts) * self.rate)
+                self.ts = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+_org_buckets: dict[str, TokenBucket] = {}
+_key_buckets: dict[str, TokenBucket] = {}
+
+
+def _bucket(buckets: dict[str, TokenBucket], key: str, rate: float,
+            name: str) -> TokenBucket:
+    bucket = buckets.get(key)
+    if bucket is None:
+        bucket = buckets[key] = TokenBucket(rate, name)
+    return bucket
+
+
+async def acquire(api_key: str, org_id: str | None):
+    """Wait for a token from both the organization and API key bucket."""
+    tenant = (api_key, org_id)
+    if org_id is not None:
+        await _bucket(_org_buckets, org_id, RATE_LIMIT_ORG,
+                      ORG_QUEUE_DEPTH).acquire(tenant)
+    await _bucket(_key_buckets, api_key, RATE_LIMIT_KEY,
+                  KEY_QUEUE_DEPTH).acquire(tenant)
+
+
+def throttle(api_key: str, org_id: str | None, seconds: float):
+    """Pause the bucket which was rejected with a 429 response."""
+    if org_id is not None:
+        _bucket(_org_buckets, org_id, RATE_LIMIT_ORG,
+                ORG_QUEUE_DEPTH).pause(seconds)
+    else:
+        _bucket(_key_buckets, api_key, RATE_LIMIT_KEY,
+                KEY_QUEUE_DEPTH).pause(seconds)
@@ -0,0 +1,108 @@
+import asyncio
+import math
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable, TypeVar
+from .breaker import CircuitOpenError
+from .deadline import time_left
+from .metrics import on_wait
+from .query import NotFoundError
+from .trace import span
+
+
+T = TypeVar('T')
+
+# Meraki aggregates data in 5 minute buckets. Data for a bucket is usually
+# available DATA_READY_LAG seconds after the bucket is closed.
+BUCKET = 300
+DATA_READY_LAG = 30.0
+
+# First re-poll is after REPOLL_DELAY seconds, doubled for each next attempt.
+REPOLL_DELAY = 16.0
+REPOLL_MAX_ATTEMPTS = 3
+
+# Re-polls are grouped in waves on a grid of WAVE_STEP seconds. Requests in
+# the same wave are sent together and thus combined by the batch layer.
+WAVE_STEP = 5.0
+
+# Time reserved for the re-poll request itself.
+REQUEST_MARGIN = 10.0
+
+_waves: dict[float, asyncio.Future] = {}
+
+# True while re-polling; a re-poll must not be served from a (prefetched)
+# snapshot as this would return the same not ready data again.
+repolling: ContextVar[bool] = ContextVar('repolling', default=False)
+
+
+def _on_wave(ts: float):
+    fut = _waves.pop(ts)
+    if not fut.done():
+        fut.set_result(None)
+
+
+def _next_wave(attempt: int) -> float:
+    now = time.time()
+    ts = now + REPOLL_DELAY * 2 ** attempt
+
+    # Wait for the data of the current bucket if the bucket just closed
+    ready_ts = now - now % BUCKET + DATA_READY_LAG
+    if ts < ready_ts:
+        ts = ready_ts
+
+    return math.ceil(ts / WAVE_STEP) * WAVE_STEP
+
+
+async def _wait_wave(ts: float):
+    fut = _waves.get(ts)
+    if fut is None:
+        loop = asyncio.get_running_loop()
+        fut = _waves[ts] = loop.create_future()
+        loop.call_later(ts - time.time(), _on_wave, ts)
+    await asyncio.shield(fut)
+
+
+async def _attempt(func: Callable[[], Awaitable[T]], attempt: int) -> T:
+    token = repolling.set(attempt > 0)
+    try:
+        return await func()
+    finally:
+        repolling.reset(token)
+
+
+async def repoll(func: Callable[[], Awaitable[T]],
+                 ready: Callable[[T], bool] | None = None) -> T:
+    """Call `func` until the result is ready.
+
+    When `func` raises an exception or `ready` returns False, the request is
+    re-polled in a later wave using exponential backoff, as long as this
+    fits within the check deadline. When no attempt is left, the exception is
+    raised or the result is returned as is.
+    """
+    attempt = 0
+    while True:
+        try:
+            res = await _attempt(func, attempt)
+        except (CircuitOpenError, NotFoundError):
+            raise  # no use to re-poll
+        except Exception:
+            if attempt + 1 >= REPOLL_MAX_ATTEMPTS:
+                raise
+            ts = _next_wave(attempt)
+            if ts - time.time() + REQUEST_MARGIN >= time_left():
+                raise
+        else:
+            try:
+                is_ready = ready is None or ready(res)
+            except Exception:
+                is_ready = False
+            if is_ready or attempt + 1 >= REPOLL_MAX_ATTEMPTS:
+                return res
+            ts = _next_wave(attempt)
+            if ts - time.time() + REQUEST_MARGIN >= time_left():
+                return res
+
+        on_wait('repoll', ts - time.time())
+        with span('repoll sleep'):
+            await _wait_wave(ts)
+        attempt += 1
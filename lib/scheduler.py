@@ -0,0 +1,123 @@
+import asyncio
+import heapq
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from .metrics import current_check, set_gauge
+
+
+# Requests from checks with a higher priority get a larger share of the
+# requests for an API key and organization; the default priority is 1.
+current_priority: ContextVar[int] = ContextVar('current_priority', default=1)
+
+# A tenant is an API key and (optional) organization ID.
+Tenant = tuple[str, str | None]
+
+
+class _Queue:
+    __slots__ = ('vtime', 'finish', 'waiters', 'depth')
+
+    def __init__(self):
+        self.vtime = 0.0
+        self.finish: dict[str, float] = {}
+        self.waiters: list[tuple[float, int, asyncio.Future]] = []
+        self.depth = 0
+
+
+class Scheduler:
+    """Fair replacement for a semaphore.
+
+    Tenants which are waiting for a slot are served round-robin so a large
+    organization (or a slow endpoint) cannot starve the others. Within a
+    tenant, the checks share the slots weighted by their priority (start
+    time fair queuing).
+    """
+
+    def __init__(self, limit: int, name: str):
+        self.limit = limit
+        self.active = 0
+        self.name = name
+        self._queues: dict[Tenant, _Queue] = {}
+        # Tenants with waiters, in round-robin order
+        self._ready: deque[Tenant] = deque()
+        self._seq = itertools.count()
+
+    def _set_depth(self, tenant: Tenant, queue: _Queue, n: int):
+        queue.depth += n
+        if self._queues.get(tenant, queue) is not queue:
+            return  # replaced by a new queue for the tenant
+        set_gauge(f'{self.name}{{organization="{tenant[1] or ""}"}}',
+                  queue.depth)
+
+    async def acquire(self, tenant: Tenant):
+        if self.active < self.limit and not self._ready:
+            self.active += 1
+            return
+
+        queue = self._queues.get(tenant)
+        if queue is None:
+            queue = self._queues[tenant] = _Queue()
+        if not queue.waiters:
+            self._ready.append(tenant)
+
+        check = current_check.get()
+        start = max(queue.vtime, queue.finish.get(check, 0.0))
+        queue.finish[check] = start + 1.0 / current_priority.get()
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiters, (start, next(self._seq), fut))
+        self._set_depth(tenant, queue, 1)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.cancelled():
+                self._set_depth(tenant, queue, -1)
+            else:
+                # The slot was handed over just before the cancellation
+                self.release()
+            raise
+
+    def _wake(self) -> bool:
+        # Hand over a slot to the next waiter; returns False if there is no
+        # waiter
+        while self._ready:
+            tenant = self._ready.popleft()
+            queue = self._queues[tenant]
+            fut = None
+            while queue.waiters and fut is None:
+                start, _, waiter = heapq.heappop(queue.waiters)
+                if not waiter.cancelled():
+                    queue.vtime = start
+                    fut = waiter
+
+            if queue.waiters:
+                self._ready.append(tenant)
+            else:
+                del self._queues[tenant]
+
+            if fut is not None:
+                # The slot is handed over to the waiter
+                self._set_depth(tenant, queue, -1)
+                fut.set_result(None)
+                return True
+        return False
+
+    def release(self):
+        # After the limit is lowered, the slot is not handed over until the
+        # number of active slots is below the new limit
+        if self.active > self.limit or not self._wake():
+            self.active -= 1
+
+    def set_limit(self, limit: int):
+        self.limit = limit
+        while self.active < self.limit and self._wake():
+            self.active += 1
+
+    @asynccontextmanager
+    async def slot(self, tenant: Tenant):
+        await self.acquire(tenant)
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,47 @@
+import logging
+import os
+import time
+from yarl import URL
+from .cache import TTLCache
+from .persist import put, restore
+
+
+# Meraki redirects organization requests to the shard host of the
+# organization. The shard is cached for SHARD_TTL seconds and later requests
+# are sent to the shard directly.
+SHARD_TTL = float(os.getenv('SHARD_TTL', '3600'))
+
+_shards = TTLCache(SHARD_TTL, 10000)
+
+
+@restore('shard')
+def _restore_shard(org_id: str, shard: str, ts: float):
+    ttl = SHARD_TTL - (time.time() - ts)
+    if ttl > 0.0:
+        _shards.set(org_id, shard, ttl)
+
+
+def base_url(org_id: str | None, default: str) -> str:
+    """Return the base URL (shard or default) for an organization."""
+    if org_id is None:
+        return default
+    return _shards.get(org_id) or default
+
+
+def learn(org_id: str | None, url: URL, default: str):
+    """Store the shard host from the final URL of a redirected request."""
+    base = URL(default)
+    if org_id is None or url.host == base.host:
+        return
+    shard = str(url.origin().with_path(base.path))
+    if _shards.get(org_id) != shard:
+        logging.debug(f'shard for organization {org_id}: {shard}')
+        put('shard', org_id, shard)
+    _shards.set(org_id, shard)
+
+
+def forget(org_id: str | None):
+    """Fall back to the default host after an error on the shard."""
+    if org_id is not None and _shards.pop(org_id) is not None:
+        logging.debug(f'forget shard for organization {org_id}')
+        put('shard', org_id, None)
@@ -0,0 +1,69 @@
+import time
+from types import MappingProxyType
+from typing import Any, Mapping
+from .projection import Fields
+from .repoll import BUCKET
+from .store import CompactRows
+
+
+# API key, path, params and fields
+EndpointKey = tuple[Any, str, str, Fields | None]
+
+
+class Endpoint:
+    def __init__(self, local_config: dict, path: str, params: str,
+                 per_page: int, fields: Fields | None):
+        self.local_config = local_config
+        self.path = path
+        self.params = params
+        self.per_page = per_page
+        self.fields = fields
+        # Serials with the time they were last requested
+        self.serials: dict[str, float] = {}
+        # Snapshot; replaced as a whole and never modified
+        self.rows: Mapping[str | None, dict[str, Any]] = MappingProxyType({})
+        self.ts = 0.0
+
+
+_endpoints: dict[EndpointKey, Endpoint] = {}
+
+
+def register(key: EndpointKey, local_config: dict, path: str, params: str,
+             per_page: int, fields: Fields | None, serial: str):
+    endpoint = _endpoints.get(key)
+    if endpoint is None:
+        endpoint = _endpoints[key] = \
+            Endpoint(local_config, path, params, per_page, fields)
+    endpoint.serials[serial] = time.time()
+
+
+def lookup(key: EndpointKey,
+           serial: str) -> tuple[bool, dict[str, Any] | None]:
+    """Return (True, row) if the serial is in a fresh snapshot."""
+    endpoint = _endpoints.get(key)
+    if endpoint is None or time.time() - endpoint.ts >= BUCKET:
+        return False, None
+    row = endpoint.rows.get(serial)
+    return row is not None, row
+
+
+def publish(key: EndpointKey, rows: dict[str | None, dict[str, Any]],
+            ts: float):
+    endpoint = _endpoints.get(key)
+    if endpoint is not None:
+        endpoint.rows = MappingProxyType(rows) if endpoint.fields is None \
+            else CompactRows(rows, endpoint.fields)
+        endpoint.ts = ts
+
+
+def endpoints() -> dict[EndpointKey, Endpoint]:
+    """Return the registered endpoints; endpoints and serials which are no
+    longer requested are removed."""
+    expired = time.time() - 2 * BUCKET
+    for key, endpoint in list(_endpoints.items()):
+        endpoint.serials = {
+            serial: ts
+            for serial, ts in endpoint.serials.items() if ts > expired}
+        if not endpoint.serials:
+            del _endpoints[key]
+    return _endpoints
@@ -0,0 +1,57 @@
+import sys
+from typing import Any, Iterator, Mapping
+from .projection import Fields, split_fields
+
+
+def _intern(value: Any) -> Any:
+    # Values like `online` or a band name are repeated for every device
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _pack(obj: dict[str, Any], fields: Fields) -> tuple:
+    plain, nested = split_fields(fields)
+    values = [_intern(obj.get(name)) for name in plain]
+    for name, sub in nested:
+        value = obj.get(name)
+        values.append(
+            [_pack(v, sub) for v in value if isinstance(v, dict)]
+            if isinstance(value, list) else
+            _pack(value, sub) if isinstance(value, dict) else
+            None)
+    return tuple(values)
+
+
+def _unpack(packed: tuple, fields: Fields) -> dict[str, Any]:
+    plain, nested = split_fields(fields)
+    obj = dict(zip(plain, packed))
+    for (name, sub), value in zip(nested, packed[len(plain):]):
+        obj[name] = \
+            [_unpack(v, sub) for v in value] if isinstance(value, list) else \
+            _unpack(value, sub) if isinstance(value, tuple) else \
+            None
+    return obj
+
+
+class CompactRows(Mapping[str | None, dict[str, Any]]):
+    """Immutable, serial indexed rows stored as tuples.
+
+    Only the projected fields are stored; rows are re-built as dicts when
+    looked up. Missing fields are returned as None.
+    """
+
+    __slots__ = ('_fields', '_index', '_rows')
+
+    def __init__(self, rows: dict[str | None, dict[str, Any]],
+                 fields: Fields):
+        self._fields = fields
+        self._index = {serial: i for i, serial in enumerate(rows)}
+        self._rows = tuple(_pack(row, fields) for row in rows.values())
+
+    def __getitem__(self, serial: str | None) -> dict[str, Any]:
+        return _unpack(self._rows[self._index[serial]], self._fields)
+
+    def __iter__(self) -> Iterator[str | None]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
@@ -0,0 +1,147 @@
+import functools
+import itertools
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, TypeVar, cast
+import aiohttp
+from libprobe.asset import Asset
+
+
+# Write a timeline of each check to this file during a dry-run, using the
+# trace event format (load in Perfetto or chrome://tracing).
+TRACE = os.getenv('TRACE') if os.getenv('DRY_RUN') else None
+
+_events: list[dict[str, Any]] = []
+_spans: dict[int, dict[str, list[float]]] = {}
+_last_end: dict[int, float] = {}
+_tid: ContextVar[int | None] = ContextVar('trace_tid', default=None)
+_ids = itertools.count(1)
+_t0 = time.perf_counter()
+
+F = TypeVar('F', bound=Callable[[Asset, dict, dict], Awaitable[dict]])
+
+
+def add_span(name: str, start: float, end: float, **args):
+    tid = _tid.get()
+    if tid is None:
+        return
+    _events.append({
+        'name': name,
+        'ph': 'X',
+        'pid': 1,
+        'tid': tid,
+        'ts': round((start - _t0) * 1e6),
+        'dur': round((end - start) * 1e6),
+        'args': args,
+    })
+    spans = _spans.get(tid)
+    if spans is not None:
+        # Not for a shared request which outlives the check
+        total = spans.setdefault(name, [0.0, 0])
+        total[0] += end - start
+        total[1] += 1
+        _last_end[tid] = max(_last_end[tid], end)
+
+
+@contextmanager
+def span(name: str, **args):
+    """Record the duration of the block when the check is traced."""
+    if _tid.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, start, time.perf_counter(), **args)
+
+
+def _write():
+    assert TRACE
+    with open(TRACE, 'w') as fp:
+        json.dump({'traceEvents': _events, 'displayTimeUnit': 'ms'}, fp)
+
+
+def _summary(tid: int, asset: Asset, duration: float) -> str:
+    spans = _spans.pop(tid)
+    spans.pop(asset.check, None)
+    parts = [
+        f'{name} {total:.3f}s ({n})'
+        for name, (total, n) in sorted(
+            spans.items(), key=lambda item: -item[1][0])]
+    return f'{asset}: {duration:.3f}s; {", ".join(parts) or "no spans"}'
+
+
+def traced(func: F) -> F:
+    """Decorator for a check run; records a timeline when TRACE is set.
+
+    Spans of concurrent requests overlap so their total time can exceed the
+    check duration.
+    """
+    if TRACE is None:
+        return func
+
+    @functools.wraps(func)
+    async def wrapper(asset: Asset, local_config: dict, config: dict):
+        tid = next(_ids)
+        token = _tid.set(tid)
+        _spans[tid] = {}
+        _events.append({
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': 1,
+            'tid': tid,
+            'args': {'name': f'{asset.check} {asset.name}'},
+        })
+        start = _last_end[tid] = time.perf_counter()
+        try:
+            return await func(asset, local_config, config)
+        finally:
+            end = time.perf_counter()
+            # Building the state follows the last request or wait
+            add_span('state build', _last_end[tid], end)
+            add_span(asset.check, start, end, asset=asset.name)
+            _tid.reset(token)
+            del _last_end[tid]
+            logging.info(f'trace {_summary(tid, asset, end - start)}')
+            _write()
+    return cast(F, wrapper)
+
+
+def _stage(name: str, on_start: Any, on_end: Any):
+    async def start(session, ctx: SimpleNamespace, params):
+        ctx.starts[name] = time.perf_counter()
+
+    async def end(session, ctx: SimpleNamespace, params):
+        ts = ctx.starts.pop(name, None)
+        if ts is not None:
+            add_span(name, ts, time.perf_counter())
+
+    on_start.append(start)
+    on_end.append(end)
+
+
+def trace_configs() -> list[aiohttp.TraceConfig]:
+    """Client session trace configs for the connection stages."""
+    if TRACE is None:
+        return []
+
+    async def on_request_start(session, ctx: SimpleNamespace, params):
+        ctx.starts = {}
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    _stage('connection queued', config.on_connection_queued_start,
+           config.on_connection_queued_end)
+    _stage('dns', config.on_dns_resolvehost_start,
+           config.on_dns_resolvehost_end)
+    _stage('connect', config.on_connection_create_start,
+           config.on_connection_create_end)
+    _stage('time to first byte', config.on_request_headers_sent,
+           config.on_request_end)
+    return [config]
@@ -1,4 +1,6 @@
+import asyncio
 import time
+from typing import Any, Coroutine
 
 
 def datetime_to_timestamp(val: str | None) -> int | None:
@@ -42,3 +44,49 @@ def to_int(val: str | None) -> int | None:
 
 def to_bool(val: str | None) -> bool | None:
     return True if val == 'True' else False if val == 'False' else None
+
+
+async def gather_or_cancel(*coros: Coroutine[Any, Any, Any]) -> list[Any]:
+    """Like asyncio.gather() but cancels the remaining tasks when one of the
+    tasks fails."""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def gather_sections(sections: dict[str, Coroutine[Any, Any, Any]],
+                          timeout: float
+                          ) -> tuple[dict[str, Any], dict[str, Exception]]:
+    """Run the sections concurrently; sections which are not finished within
+    `timeout` seconds are cancelled. Returns the results of the finished
+    sections and the errors for the others."""
+    tasks = {name: asyncio.ensure_future(coro)
+             for name, coro in sections.items()}
+    try:
+        _, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    results: dict[str, Any] = {}
+    errors: dict[str, Exception] = {}
+    for name, task in tasks.items():
+        if task in pending:
+            errors[name] = TimeoutError('not finished within the time-out')
+            continue
+        e = task.exception()
+        if e is None:
+            results[name] = task.result()
+        elif isinstance(e, Exception):
+            errors[name] = e
+        else:
+            raise e
+    return results, errors
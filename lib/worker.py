@@ -0,0 +1,248 @@
+import asyncio
+import functools
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import Any, Callable
+from libprobe.check import Check
+from libprobe.exceptions import (
+    CheckException, IgnoreCheckException, IgnoreResultException,
+    IncompleteResultException, NoCountException)
+from libprobe.logger import setup_logger
+
+
+# Run the checks in this number of worker processes; assets are sharded
+# across the workers by organization ID. Disabled when 0.
+WORKERS = int(os.getenv('WORKERS', '0'))
+
+
+# Exceptions which are re-created in the probe process with their exact
+# type and attributes (severity, result, is_exception)
+_EXCEPTIONS: dict[str, type[Exception]] = {
+    cls.__name__: cls for cls in (
+        CheckException,
+        IgnoreCheckException,
+        IgnoreResultException,
+        IncompleteResultException,
+        NoCountException,
+    )}
+
+
+def _dump(e: BaseException) -> tuple[str, str, dict[str, Any]]:
+    # Exceptions are not pickled as the libprobe exceptions do not restore
+    # their severity and result. The class name is used as message when
+    # empty, as is done by libprobe.
+    name = type(e).__name__
+    state = vars(e) if _EXCEPTIONS.get(name) is type(e) else {}
+    return name, str(e) or name, state
+
+
+def _load(name: str, msg: str, state: dict[str, Any]) -> Exception:
+    cls = _EXCEPTIONS.get(name)
+    if cls is None:
+        return Exception(msg)
+    # The constructors would change the attributes (a NoCountException
+    # without severity gets severity LOW and is_exception True)
+    e = cls.__new__(cls)
+    Exception.__init__(e, msg)
+    e.__dict__.update(state)
+    return e
+
+
+def _reader(conn: Connection, loop: asyncio.AbstractEventLoop,
+            callback: Callable[[Any], None]):
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            msg = None
+        try:
+            loop.call_soon_threadsafe(callback, msg)
+        except RuntimeError:
+            return  # event loop is closed
+        if msg is None:
+            return
+
+
+def _send(conn: Connection, msg: Any):
+    try:
+        conn.send(msg)
+    except OSError:
+        pass  # parent process has stopped
+
+
+def _on_done(send: Callable[[Any], Any], tasks: dict[int, asyncio.Task],
+             run_id: int, task: asyncio.Task):
+    tasks.pop(run_id, None)
+    if task.cancelled():
+        return
+    e = task.exception()
+    if e is None:
+        send(('ok', run_id, task.result()))
+    else:
+        send(('err', run_id, _dump(e)))
+
+
+async def _serve(conn: Connection, checks: tuple[type[Check], ...],
+                 index: int):
+    from .connector import close_sessions
+    from .metrics import METRICS_PORT, serve_metrics
+    from .persist import CACHE_FILE, flush_loop, load
+    from .prefetch import PREFETCH, prefetch_loop
+
+    by_key = {check.key: check for check in checks}
+    queue: asyncio.Queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+    threading.Thread(target=_reader, args=(conn, loop, queue.put_nowait),
+                     daemon=True).start()
+    # Results are pickled and sent by a single thread, in order, so a large
+    # result or a full pipe does not block the event loop
+    sender = ThreadPoolExecutor(max_workers=1)
+    send = functools.partial(
+        loop.run_in_executor, sender, functools.partial(_send, conn))
+
+    background = []
+    if PREFETCH:
+        background.append(asyncio.ensure_future(prefetch_loop()))
+    if METRICS_PORT:
+        background.append(asyncio.ensure_future(
+            serve_metrics(METRICS_PORT + index)))
+    if CACHE_FILE:
+        # The workers use their own cache file
+        load(f'{CACHE_FILE}.{index}')
+        background.append(asyncio.ensure_future(flush_loop()))
+
+    tasks: dict[int, asyncio.Task] = {}
+    while True:
+        msg = await queue.get()
+        if msg is None:
+            break  # parent process has stopped
+        kind, run_id, *args = msg
+        if kind == 'run':
+            key, asset, local_config, config = args
+            task = tasks[run_id] = asyncio.ensure_future(
+                by_key[key].run(asset, local_config, config))
+            task.add_done_callback(
+                functools.partial(_on_done, send, tasks, run_id))
+        elif kind == 'cancel':
+            task = tasks.get(run_id)
+            if task is not None:
+                task.cancel()
+
+    for task in (*tasks.values(), *background):
+        task.cancel()
+    sender.shutdown(wait=False)
+    await close_sessions()
+
+
+def _worker(conn: Connection, checks: tuple[type[Check], ...], index: int,
+            workers: int, initializer: Callable | None, initargs: tuple):
+    from . import ratelimit
+    # Spawned processes start without the logging setup of the probe
+    setup_logger()
+    # Each worker gets an equal share of the API key rate limit; as assets
+    # are sharded by organization, the organization limit is not shared.
+    ratelimit.RATE_LIMIT_KEY /= workers
+    if initializer is not None:
+        initializer(*initargs)
+    asyncio.run(_serve(conn, checks, index))
+
+
+class Pool:
+    """Runs checks in worker processes while the probe (and connection to
+    the AgentCore) remains in the main process."""
+
+    def __init__(self, checks: tuple[type[Check], ...], workers: int,
+                 initializer: Callable | None = None, initargs: tuple = ()):
+        self._checks = checks
+        self._workers = workers
+        self._initializer = initializer
+        self._initargs = initargs
+        self._ctx = multiprocessing.get_context('spawn')
+        self._conns: list[Connection | None] = [None] * workers
+        self._futures: dict[int, tuple[int, asyncio.Future]] = {}
+        self._ids = itertools.count()
+        # Readers are started with the first check, on the probe event loop
+        self._loop: asyncio.AbstractEventLoop | None = None
+        for index in range(workers):
+            self._spawn(index)
+
+    def _spawn(self, index: int):
+        parent, child = self._ctx.Pipe()
+        proc = self._ctx.Process(
+            target=_worker,
+            args=(child, self._checks, index, self._workers,
+                  self._initializer, self._initargs),
+            daemon=True)
+        proc.start()
+        child.close()
+        self._conns[index] = parent
+        if self._loop is not None:
+            self._start_reader(index, parent, self._loop)
+
+    def _start_reader(self, index: int, conn: Connection,
+                      loop: asyncio.AbstractEventLoop):
+        callback = functools.partial(self._on_msg, index, conn)
+        threading.Thread(target=_reader, args=(conn, loop, callback),
+                         daemon=True).start()
+
+    def _on_msg(self, index: int, conn: Connection, msg: Any):
+        if msg is None:
+            if self._conns[index] is not conn:
+                return
+            logging.error(f'worker {index} has stopped; restarting...')
+            for run_id, (i, fut) in list(self._futures.items()):
+                if i == index:
+                    del self._futures[run_id]
+                    if not fut.done():
+                        fut.set_exception(
+                            Exception(f'worker {index} has stopped'))
+            self._spawn(index)
+            return
+
+        kind, run_id, payload = msg
+        _, fut = self._futures.pop(run_id, (None, None))
+        if fut is None or fut.done():
+            return
+        if kind == 'ok':
+            fut.set_result(payload)
+        else:
+            fut.set_exception(_load(*payload))
+
+    def _index(self, org_id: Any) -> int:
+        return zlib.crc32(str(org_id).encode()) % self._workers
+
+    async def run(self, check_key: str, asset, local_config: dict,
+                  config: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+            for index, conn in enumerate(self._conns):
+                assert conn is not None
+                self._start_reader(index, conn, loop)
+
+        index = self._index(config.get('id'))
+        conn = self._conns[index]
+        assert conn is not None
+        run_id = next(self._ids)
+        fut = loop.create_future()
+        self._futures[run_id] = index, fut
+        conn.send(('run', run_id, check_key, asset, local_config, config))
+        try:
+            return await fut
+        except asyncio.CancelledError:
+            # Time-out by the probe; cancel the check in the worker as well
+            if self._futures.pop(run_id, None) is not None:
+                conn.send(('cancel', run_id, None))
+            raise
+
+    def proxy(self, check: type[Check]) -> type[Check]:
+        """Return a check class which runs the given check in a worker."""
+        async def run(asset, local_config: dict, config: dict) -> dict:
+            return await self.run(check.key, asset, local_config, config)
+        return type(check.__name__, (check,), {'run': staticmethod(run)})
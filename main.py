@@ -1,10 +1,17 @@
+import asyncio
+import os
 from libprobe.probe import Probe
 from lib.check.wireless import CheckWireless
 from lib.check.memory import CheckMemory
 from lib.check.packet import CheckPacket
 from lib.check.connection import CheckConnection
 from lib.check.bss import CheckBss
+from lib.connector import close_sessions, close_sessions_on_stop
+from lib.metrics import METRICS_PORT, serve_metrics
+from lib.persist import CACHE_FILE, flush_loop, load
+from lib.prefetch import PREFETCH, prefetch_loop
 from lib.version import __version__ as version
+from lib.worker import WORKERS, Pool
 
 
 if __name__ == '__main__':
@@ -16,6 +23,36 @@ if __name__ == '__main__':
         CheckBss,
     )
 
+    dry_run = bool(os.getenv('DRY_RUN'))
+    use_workers = WORKERS > 0 and not dry_run
+    if use_workers:
+        # The checks run in the worker processes, each with their own
+        # prefetch and metrics; this process only holds the connection to
+        # the AgentCore and schedules the checks
+        pool = Pool(checks, WORKERS)
+        checks = tuple(pool.proxy(check) for check in checks)
+
     probe = Probe("merakiwireless", version, checks)
 
-    probe.start()
+    loop = asyncio.new_event_loop()
+
+    if dry_run:
+        # The on-close hook is only awaited at the end of a dry-run
+        probe.set_on_close(close_sessions)
+    else:
+        # When stopped as a service, libprobe cancels all tasks before the
+        # event loop is closed; the reference keeps the (otherwise idle)
+        # task from being garbage collected
+        close_task = loop.create_task(close_sessions_on_stop())
+
+    if not dry_run and not use_workers:
+        if PREFETCH:
+            loop.create_task(prefetch_loop())
+        if CACHE_FILE:
+            load(CACHE_FILE)
+            loop.create_task(flush_loop())
+
+    if METRICS_PORT and not use_workers:
+        loop.create_task(serve_metrics())
+
+    probe.start(loop)